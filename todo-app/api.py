@@ -1,14 +1,353 @@
-from flask import Flask, render_template, request, redirect, url_for
+import atexit
+import contextlib
+import cProfile
+import io
+import os
+import pstats
+import time
+from flask import Flask, render_template, request, redirect, url_for, abort, g, Response
 from pathlib import Path
+from datetime import datetime, timedelta
 
-from backend import Todo
+from backend import Todo, TodoRegistry
+from backend.data import parse_datetime
+from backend.metrics import metrics
+from backend.migrations import UnsupportedVersionError
+from backend.response_cache import ResponseCache
 
 app = Flask(__name__)
+# Timings for /metrics (TODO_METRICS=0 turns them off)
+metrics.enabled = os.environ.get("TODO_METRICS", "1") != "0"
+# Allow ?profile=1 on any request to get cProfile stats back instead of the response
+app.config["PROFILE_REQUESTS"] = os.environ.get("TODO_PROFILE") == "1"
 
-@app.route("/api", methods=["GET", "POST"])
-def set_todo():
-    global todo
-    todo = Todo("todo_data.json")
-    return todo.data.model_dump()
+DEFAULT_LIST = "default"
+# One open store per list; the default list keeps the original data file
+registry = TodoRegistry("lists", max_open=256, paths={DEFAULT_LIST: "todo_data.json"},
+                        persist_history=True, process_lock=True)
+atexit.register(registry.close_all)
+# Encoded read responses, reused until the store/section they show changes
+response_cache = ResponseCache(encode=app.json.dumps)
 
-app.run(debug=True)
\ No newline at end of file
+def list_route(rule: str, **options):
+    """Register a route for the default list (/api...) and for any list (/api/lists/<id>...)"""
+    def decorator(view):
+        app.route(f"/api{rule}", defaults={"list_id": DEFAULT_LIST}, **options)(view)
+        return app.route(f"/api/lists/<list_id>{rule}", **options)(view)
+    return decorator
+
+def get_todo(list_id: str) -> Todo:
+    """Get the store of a list from the registry, locked until the request ends"""
+    try:
+        todo = registry.get(list_id)
+    except UnsupportedVersionError as e:
+        # The file is left alone for the release that wrote it
+        abort(500, str(e))
+    except ValueError as e:
+        abort(404, str(e))
+    if "store_locks" not in g:
+        g.store_locks = contextlib.ExitStack()
+    g.store_locks.enter_context(todo.transaction())
+    return todo
+
+@app.teardown_request
+def release_store_locks(exc):
+    locks = g.pop("store_locks", None)
+    if locks is not None:
+        locks.close()
+
+def cached_json(key, revision: int, build):
+    """Serve JSON from the response cache, gzipped if the client accepts it"""
+    cached = response_cache.get(key, revision, build)
+    use_gzip = cached.gzipped is not None and "gzip" in request.accept_encodings
+    etag = cached.etag + ("-gz" if use_gzip else "")
+    if etag in request.if_none_match:
+        return Response(status=304, headers={"ETag": f'"{etag}"', "Vary": "Accept-Encoding"})
+    response = Response(cached.gzipped if use_gzip else cached.body, mimetype="application/json",
+                        headers={"ETag": f'"{etag}"', "Vary": "Accept-Encoding"})
+    if use_gzip:
+        response.headers["Content-Encoding"] = "gzip"
+    return response
+
+@app.before_request
+def start_request_timer():
+    g.request_start = time.perf_counter()
+    if app.config["PROFILE_REQUESTS"] and request.args.get("profile"):
+        g.profiler = cProfile.Profile()
+        g.profiler.enable()
+
+@app.after_request
+def record_request(response):
+    profiler = g.pop("profiler", None)
+    if profiler:
+        profiler.disable()
+        out = io.StringIO()
+        pstats.Stats(profiler, stream=out).sort_stats("cumulative").print_stats(40)
+        response = Response(out.getvalue(), mimetype="text/plain")
+    if "request_start" in g:
+        metrics.observe("todo_api_request_seconds", time.perf_counter() - g.request_start,
+                        endpoint=request.url_rule.rule if request.url_rule else "unknown")
+    metrics.inc("todo_api_requests_total", status=response.status_code)
+    return response
+
+@app.route("/metrics", methods=["GET"])
+def export_metrics():
+    metrics.set_gauge("todo_registry_open_lists", len(registry))
+    metrics.set_gauge("todo_registry_hits", registry.hits)
+    metrics.set_gauge("todo_registry_misses", registry.misses)
+    metrics.set_gauge("todo_registry_evictions", registry.evictions)
+    metrics.set_gauge("todo_response_cache_entries", len(response_cache))
+    metrics.set_gauge("todo_response_cache_hits", response_cache.hits)
+    metrics.set_gauge("todo_response_cache_misses", response_cache.misses)
+    return Response(metrics.render_prometheus(), mimetype="text/plain; version=0.0.4")
+
+def parse_page_args(default_limit: int = 50, max_limit: int = 500):
+    """Read offset/limit from the query string"""
+    offset = request.args.get("offset", 0, type=int)
+    limit = request.args.get("limit", default_limit, type=int)
+    if offset < 0 or not 0 < limit <= max_limit:
+        abort(400, f"'offset' must be >= 0 and 'limit' between 1 and {max_limit}")
+    return offset, limit
+
+def tree_node(todo: Todo, task) -> dict:
+    """A task without its subtasks, for one level of the tree"""
+    child_count = todo.live_child_count(task.id)
+    return {**task.model_dump(exclude={"subtasks"}), "has_children": child_count > 0, "child_count": child_count}
+
+def tree_page(todo: Todo, page, offset: int, limit: int) -> dict:
+    total, tasks = page
+    return {"total": total, "offset": offset, "limit": limit, "items": [tree_node(todo, task) for task in tasks]}
+
+def parse_datetime_arg(name: str, default=None):
+    """Read an ISO date/time from the query string"""
+    value = request.args.get(name)
+    if not value:
+        return default
+    try:
+        return parse_datetime(value)
+    except ValueError:
+        abort(400, f"Invalid '{name}' date: {value}")
+
+@list_route("", methods=["GET", "POST"])
+def set_todo(list_id):
+    todo = get_todo(list_id)
+
+    def build():
+        todo.load_all_shards()
+        with metrics.timer("todo_stage_seconds", stage="dump"):
+            return todo.data.model_dump()
+    return cached_json((list_id, "store"), todo.revision, build)
+
+@list_route("/sections/<name>", methods=["GET"])
+def get_section(list_id, name):
+    todo = get_todo(list_id)
+
+    def build():
+        section = todo.get_section_by_name(name)
+        if section is None:
+            abort(404, f"Section '{name}' not found")
+        return section.model_dump()
+    return cached_json((list_id, "section", name), todo.section_revision(name), build)
+
+@list_route("/tree", methods=["GET"])
+def tree_sections(list_id):
+    todo = get_todo(list_id)
+    return cached_json((list_id, "tree"), todo.revision, lambda: {"sections": todo.section_summaries()})
+
+@list_route("/tree/sections/<name>", methods=["GET"])
+def tree_section_tasks(list_id, name):
+    todo = get_todo(list_id)
+    offset, limit = parse_page_args()
+
+    def build():
+        page = todo.get_section_page(name, offset, limit)
+        if page is None:
+            abort(404, f"Section '{name}' not found")
+        return tree_page(todo, page, offset, limit)
+    return cached_json((list_id, "tree", name, offset, limit), todo.section_revision(name), build)
+
+@list_route("/tree/tasks/<task_id>", methods=["GET"])
+def tree_task_children(list_id, task_id):
+    todo = get_todo(list_id)
+    offset, limit = parse_page_args()
+    page = todo.get_subtask_page(task_id, offset, limit)
+    if page is None:
+        abort(404, f"Task '{task_id}' not found")
+    return tree_page(todo, page, offset, limit)
+
+@list_route("/tags", methods=["GET"])
+def tag_counts(list_id):
+    todo = get_todo(list_id)
+    try:
+        return todo.tag_counts(request.args.get("q") or None)
+    except ValueError as e:
+        abort(400, str(e))
+
+@list_route("/tasks/query", methods=["GET"])
+def query_tasks(list_id):
+    todo = get_todo(list_id)
+    query = request.args.get("q", "")
+    try:
+        tasks = todo.find_tasks(query)
+        counts = todo.tag_counts(query)
+    except ValueError as e:
+        abort(400, str(e))
+    return {"query": query, "count": len(tasks), "tag_counts": counts,
+            "tasks": [task.model_dump() for task in tasks]}
+
+@list_route("/tasks/<task_id>/tags", methods=["POST"])
+def tag_task(list_id, task_id):
+    todo = get_todo(list_id)
+    add = [tag for tag in request.args.get("add", "").split(",") if tag.strip()]
+    remove = [tag for tag in request.args.get("remove", "").split(",") if tag.strip()]
+    task = todo.tag_task(task_id, add, remove)
+    if task is None:
+        abort(404, f"Task '{task_id}' not found")
+    return task.model_dump()
+
+@list_route("/tasks/ready", methods=["GET"])
+def ready_tasks(list_id):
+    todo = get_todo(list_id)
+    return [task.model_dump() for task in todo.get_ready_tasks()]
+
+@list_route("/tasks/order", methods=["GET"])
+def topological_order(list_id):
+    todo = get_todo(list_id)
+    try:
+        return [task.model_dump() for task in todo.topological_order()]
+    except ValueError as e:
+        abort(409, str(e))
+
+@list_route("/tasks/critical-path", methods=["GET"])
+def critical_path(list_id):
+    todo = get_todo(list_id)
+    try:
+        tasks = todo.critical_path()
+    except ValueError as e:
+        abort(409, str(e))
+    return {"length": len(tasks), "tasks": [task.model_dump() for task in tasks]}
+
+@list_route("/tasks/<task_id>/blocked-by/<blocker_id>", methods=["POST", "DELETE"])
+def task_dependency(list_id, task_id, blocker_id):
+    todo = get_todo(list_id)
+    if request.method == "DELETE":
+        task = todo.remove_dependency(task_id, blocker_id)
+    else:
+        try:
+            task = todo.add_dependency(task_id, blocker_id)
+        except ValueError as e:
+            abort(409, str(e))
+    if task is None:
+        abort(404, f"Task '{task_id}' or '{blocker_id}' not found")
+    return {**task.model_dump(), "blockers": [blocker.id for blocker in todo.get_blockers(task_id)]}
+
+@list_route("/tasks/<task_id>/recurrence", methods=["POST", "DELETE"])
+def set_recurrence(list_id, task_id):
+    todo = get_todo(list_id)
+    rule = request.args.get("rule") if request.method == "POST" else None
+    if request.method == "POST" and not rule:
+        abort(400, "Missing 'rule'")
+    try:
+        task = todo.set_recurrence(task_id, rule)
+    except ValueError as e:
+        abort(400, str(e))
+    if task is None:
+        abort(404, f"Task '{task_id}' not found")
+    return task.model_dump()
+
+@list_route("/recurrences/upcoming", methods=["GET"])
+def upcoming_occurrences(list_id):
+    todo = get_todo(list_id)
+    end = parse_datetime_arg("to", datetime.now() + timedelta(days=7))
+    try:
+        upcoming = todo.upcoming_occurrences(end)
+    except ValueError as e:
+        abort(400, str(e))
+    return [{"due_at": due_at, "task": task.model_dump()} for due_at, task in upcoming]
+
+@list_route("/recurrences/materialize", methods=["POST"])
+def materialize_recurrences(list_id):
+    todo = get_todo(list_id)
+    try:
+        created = todo.materialize_recurrences(parse_datetime_arg("now"))
+    except ValueError as e:
+        abort(400, str(e))
+    return [task.model_dump() for task in created]
+
+@list_route("/tasks/<task_id>", methods=["GET"])
+def get_task(list_id, task_id):
+    todo = get_todo(list_id)
+    revision = todo.task_revision(task_id)
+    if revision is None:
+        abort(404, f"Task '{task_id}' not found")
+    return cached_json((list_id, "task", task_id), revision, lambda: todo.get_task(task_id).model_dump())
+
+@list_route("/tasks/next", methods=["GET"])
+def next_due_tasks(list_id):
+    todo = get_todo(list_id)
+    n = request.args.get("n", 10, type=int)
+    return [task.model_dump() for task in todo.next_due(n)]
+
+@list_route("/tasks/overdue", methods=["GET"])
+def overdue_tasks(list_id):
+    todo = get_todo(list_id)
+    now = parse_datetime_arg("now", datetime.now())
+    return [task.model_dump() for task in todo.overdue(now)]
+
+@list_route("/tasks/due", methods=["GET"])
+def tasks_due_between(list_id):
+    todo = get_todo(list_id)
+    start = parse_datetime_arg("from", datetime.min)
+    end = parse_datetime_arg("to", datetime.max)
+    return [task.model_dump() for task in todo.due_between(start, end)]
+
+@list_route("/tasks/updated", methods=["GET"])
+def tasks_updated_since(list_id):
+    todo = get_todo(list_id)
+    since = parse_datetime_arg("since", datetime.min)
+    return [task.model_dump() for task in todo.tasks_updated_since(since)]
+
+@list_route("/tasks/created", methods=["GET"])
+def tasks_created_between(list_id):
+    todo = get_todo(list_id)
+    start = parse_datetime_arg("from", datetime.min)
+    end = parse_datetime_arg("to", datetime.max)
+    return [task.model_dump() for task in todo.tasks_created_between(start, end)]
+
+@list_route("/activity", methods=["GET"])
+def recent_activity(list_id):
+    todo = get_todo(list_id)
+    n = request.args.get("n", 20, type=int)
+    return [task.model_dump() for task in todo.recent_activity(n)]
+
+@list_route("/undo", methods=["POST"])
+def undo(list_id):
+    todo = get_todo(list_id)
+    return {"undone": todo.undo(), "can_undo": todo.history.can_undo(), "can_redo": todo.history.can_redo()}
+
+@list_route("/redo", methods=["POST"])
+def redo(list_id):
+    todo = get_todo(list_id)
+    return {"redone": todo.redo(), "can_undo": todo.history.can_undo(), "can_redo": todo.history.can_redo()}
+
+@list_route("/trash", methods=["GET"])
+def deleted_tasks(list_id):
+    todo = get_todo(list_id)
+    return [task.model_dump() for task in todo.get_deleted_tasks()]
+
+@list_route("/archive", methods=["GET"])
+def archived_tasks(list_id):
+    todo = get_todo(list_id)
+    return [task.model_dump() for task in todo.get_archived_tasks()]
+
+@list_route("/maintenance", methods=["POST"])
+def run_maintenance(list_id):
+    todo = get_todo(list_id)
+    days = request.args.get("archive_after_days", type=int)
+    recurring = todo.materialize_recurrences()
+    archived = todo.archive_completed(None if days is None else timedelta(days=days))
+    purged = todo.compact(timedelta(days=todo.data.settings.get("purge_deleted_after_days", 7)))
+    return {"recurring": len(recurring), "archived": archived, "purged": purged}
+
+if __name__ == "__main__":
+    app.run(debug=True)
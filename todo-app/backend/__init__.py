@@ -1 +1,2 @@
-from .todo import Todo
\ No newline at end of file
+from .todo import Todo
+from .registry import TodoRegistry
\ No newline at end of file
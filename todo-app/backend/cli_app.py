@@ -1,12 +1,14 @@
 import os
 import sys
-from todo import Todo
-from data import Task
+from datetime import datetime, timedelta
+from typing import Optional
+from todo import Todo, UnsupportedVersionError
+from data import Task, parse_datetime
 
 class CliApp:
     def __init__(self, todo_file: str = "todo_data.json"):
         """Initialize the application"""
-        self.config = Todo(todo_file)
+        self.config = Todo(todo_file, persist_history=True)
         self.running = True
 
 # ======== menu methods ========    
@@ -29,6 +31,13 @@ class CliApp:
         print("7️⃣  List completed tasks")
         print("8️⃣  List sections")
         print("9️⃣  Manage sections")
+        print("🔟 Schedule")
+        print("1️⃣1️⃣ Recent activity")
+        print("1️⃣2️⃣ Undo last change")
+        print("1️⃣3️⃣ Redo")
+        print("1️⃣4️⃣ Trash & archive")
+        print("1️⃣5️⃣ Tags")
+        print("1️⃣6️⃣ Dependencies")
         print("0️⃣  Exit")
         print("=" * 50)
         
@@ -50,12 +59,32 @@ class CliApp:
         """Pause for user input"""
         input("\n📝 Press Enter to continue...")
 
+    def get_datetime_input(self, prompt: str) -> Optional[datetime]:
+        """Get an optional date/time (YYYY-MM-DD [HH:MM]) from the user"""
+        while True:
+            value = input(prompt).strip()
+            if not value:
+                return None
+            try:
+                return parse_datetime(value)
+            except ValueError:
+                print("Invalid date, use YYYY-MM-DD or YYYY-MM-DD HH:MM")
+
+    def print_scheduled_tasks(self, tasks):
+        """Print tasks with their due date and priority"""
+        if not tasks:
+            print("No tasks found.")
+            return
+        for task in tasks:
+            priority = "-" if task.priority is None else task.priority
+            print(f"- [{task.id}] {task.title} (due: {task.due_at:%Y-%m-%d %H:%M} | priority: {priority})")
+
     def list_sections(self):
         """Print all sections"""
         self.clear_screen()
         print("📂 Sections:")
-        for section in self.config.data.sections:
-            print(f"- {section.name} ({len(section.tasks)} tasks)")
+        for section in self.config.get_all_sections():
+            print(f"- {section.name} ({self.config.section_task_count(section.name)} tasks)")
         self.pause()
 
     def list_tasks(self):
@@ -101,7 +130,7 @@ class CliApp:
             return
         
         print(f"📂 Tasks in Section: {section.name}")
-        for task in section.tasks:
+        for task in section.get_active_tasks():
             status = "✅ Completed" if task.completed else "❌ Pending"
             print(f"- {task.title} ({status})")
         self.pause()
@@ -148,6 +177,20 @@ class CliApp:
                     self.list_sections()
                 case '9':
                     self.manage_sections()
+                case '10':
+                    self.manage_schedule()
+                case '11':
+                    self.show_recent_activity()
+                case '12':
+                    self.undo()
+                case '13':
+                    self.redo()
+                case '14':
+                    self.manage_archive()
+                case '15':
+                    self.manage_tags()
+                case '16':
+                    self.manage_dependencies()
                 case '0':
                     self.running = False
     
@@ -157,8 +200,12 @@ class CliApp:
         
         title = self.get_user_input("➕ Create New Task", "Enter task title:")
         description = input("Enter task description (optional): ").strip()
+        due_at = self.get_datetime_input("Enter due date (optional, YYYY-MM-DD [HH:MM]): ")
+        priority = input("Enter priority (optional, 1 = highest): ").strip()
+        tags = input("Enter tags (optional, comma separated): ").split(",")
 
-        task = Task(title=title, description=description)
+        task = Task(title=title, description=description, due_at=due_at,
+                    priority=int(priority) if priority.isdigit() else None, tags=tags)
         self.config.add_task_to_section(task, section_name)
         print(f"Task '{task.title}' added successfully!")
         self.pause()
@@ -166,31 +213,27 @@ class CliApp:
     def mark_task_complete(self):
         """Mark a task as complete"""
         task_id = input("Enter task ID to mark as complete: ").strip()
-        task = self.config.get_task(task_id)
+        task = self.config.complete_task(task_id)
         
         if not task:
             print(f"Task with ID {task_id} not found.")
             self.pause()
             return
         
-        task.complete()
-        self.config.save_to_file()
         print(f"Task '{task.title}' marked as complete.")
         self.pause()
         
     def mark_task_incomplete(self):
         """Mark a task as incomplete"""
-        task_id = input("Enter task ID to mark as complete: ").strip()
-        task = self.config.get_task(task_id)
+        task_id = input("Enter task ID to mark as incomplete: ").strip()
+        task = self.config.incomplete_task(task_id)
         
         if not task:
             print(f"Task with ID {task_id} not found.")
             self.pause()
             return
         
-        task.incomplete()
-        self.config.save_to_file()
-        print(f"Task '{task.title}' marked as complete.")
+        print(f"Task '{task.title}' marked as incomplete.")
         self.pause()
         
     def delete_task(self):
@@ -199,10 +242,10 @@ class CliApp:
         self.select_section
         task_id = input("Enter task ID to delete: ").strip()
         
-        if not self.config.remove_task_by_id(task_id):
+        if not self.config.soft_delete_task(task_id):
             print(f"Task with ID {task_id} not found.")
         else:
-            print(f"Task with ID {task_id} deleted successfully.")
+            print(f"Task with ID {task_id} moved to trash.")
         self.pause()
 
     def manage_sections(self):
@@ -228,9 +271,264 @@ class CliApp:
             
         
         self.pause()
+
+    def manage_schedule(self):
+        """Show upcoming and overdue tasks, set due dates"""
+        self.clear_screen()
+        print("📅 Schedule")
+        print("=" * 20)
+        print("1️⃣  Next due tasks")
+        print("2️⃣  Overdue tasks")
+        print("3️⃣  Tasks due between dates")
+        print("4️⃣  Set due date / priority")
+        print("5️⃣  Make a task repeat")
+        print("6️⃣  Upcoming recurring tasks")
+        print("0️⃣  Exit")
+        print("=" * 20)
+        
+        choice = input("Select option: ").strip()
+        
+        if choice == '1':
+            count = input("How many tasks? (default: 10): ").strip()
+            self.print_scheduled_tasks(self.config.next_due(int(count) if count.isdigit() else 10))
+            
+        elif choice == '2':
+            self.print_scheduled_tasks(self.config.overdue())
+            
+        elif choice == '3':
+            start = self.get_datetime_input("From (YYYY-MM-DD [HH:MM]): ") or datetime.now()
+            end = self.get_datetime_input("To (YYYY-MM-DD [HH:MM]): ") or datetime.max
+            self.print_scheduled_tasks(self.config.due_between(start, end))
+            
+        elif choice == '4':
+            task_id = input("Enter task ID: ").strip()
+            due_at = self.get_datetime_input("Enter due date (empty to clear): ")
+            priority = input("Enter priority (empty to clear, 1 = highest): ").strip()
+            task = self.config.update_task(task_id, due_at=due_at,
+                                           priority=int(priority) if priority.isdigit() else None)
+            if not task:
+                print(f"Task with ID {task_id} not found.")
+            else:
+                print(f"Task '{task.title}' rescheduled.")
+                
+        elif choice == '5':
+            task_id = input("Enter task ID: ").strip()
+            rule = input("Repeat (daily, weekly, monthly, yearly, every N days/weeks/months | empty to stop): ").strip()
+            try:
+                task = self.config.set_recurrence(task_id, rule or None)
+            except ValueError as e:
+                print(f"❌ {e}")
+                task = None
+            if task:
+                print(f"Task '{task.title}' repeats: {task.recurrence or 'never'}")
+                
+        elif choice == '6':
+            days = input("How many days ahead? (default: 7): ").strip()
+            try:
+                end = datetime.now() + timedelta(days=int(days) if days.isdigit() else 7)
+                occurrences = self.config.upcoming_occurrences(end)
+            except (ValueError, OverflowError) as e:
+                print(f"❌ {e}")
+            else:
+                if not occurrences:
+                    print("No recurring tasks coming up.")
+                for due_at, task in occurrences:
+                    print(f"- {due_at:%Y-%m-%d %H:%M} {task.title} ({task.recurrence})")
+        
+        self.pause()
+
+    def show_recent_activity(self):
+        """Show recently changed tasks"""
+        self.clear_screen()
+        print("🕒 Recent Activity")
+        print("=" * 20)
+        since = self.get_datetime_input("Changes since (optional, YYYY-MM-DD [HH:MM] | default: last 20 changes): ")
+        
+        if since:
+            tasks = list(reversed(self.config.tasks_updated_since(since)))
+        else:
+            tasks = self.config.recent_activity(20)
+            
+        if not tasks:
+            print("No activity found.")
+        else:
+            for task in tasks:
+                status = "✅ Completed" if task.completed else "❌ Pending"
+                print(f"- {task.updated_at:%Y-%m-%d %H:%M} [{task.id}] {task.title} ({status})")
+        self.pause()
+
+    def manage_archive(self):
+        """Trash and archive of old completed tasks"""
+        self.clear_screen()
+        print("🗄️  Trash & Archive")
+        print("=" * 20)
+        print("1️⃣  Show trash")
+        print("2️⃣  Restore task from trash")
+        print("3️⃣  Empty trash")
+        print("4️⃣  Archive old completed tasks")
+        print("5️⃣  Show archive")
+        print("6️⃣  Restore task from archive")
+        print("0️⃣  Exit")
+        print("=" * 20)
+        
+        choice = input("Select option: ").strip()
+        
+        if choice == '1':
+            tasks = self.config.get_deleted_tasks()
+            if not tasks:
+                print("Trash is empty.")
+            for task in tasks:
+                print(f"- [{task.id}] {task.title} (deleted: {task.deleted_at:%Y-%m-%d %H:%M})")
+                
+        elif choice == '2':
+            task_id = input("Enter task ID to restore: ").strip()
+            task = self.config.restore_deleted_task(task_id)
+            if task:
+                print(f"Task '{task.title}' restored.")
+                
+        elif choice == '3':
+            print(f"{self.config.compact()} tasks purged.")
+            
+        elif choice == '4':
+            days = input("Archive tasks completed more than N days ago (default: from settings): ").strip()
+            older_than = timedelta(days=int(days)) if days.isdigit() else None
+            print(f"{self.config.archive_completed(older_than)} tasks archived.")
+            
+        elif choice == '5':
+            tasks = self.config.get_archived_tasks()
+            if not tasks:
+                print("Archive is empty.")
+            for task in tasks:
+                print(f"- [{task.id}] {task.title}")
+                
+        elif choice == '6':
+            task_id = input("Enter task ID to restore: ").strip()
+            task = self.config.unarchive_task(task_id)
+            if task:
+                print(f"Task '{task.title}' restored.")
+        
+        self.pause()
+
+    def manage_tags(self):
+        """Tag tasks and search them by tags"""
+        self.clear_screen()
+        print("🏷️  Tags")
+        print("=" * 20)
+        print("1️⃣  Show tags")
+        print("2️⃣  Tag / untag a task")
+        print("3️⃣  Search tasks (e.g. tag:urgent AND tag:backend NOT completed)")
+        print("0️⃣  Exit")
+        print("=" * 20)
+        
+        choice = input("Select option: ").strip()
+        
+        if choice == '1':
+            counts = self.config.tag_counts()
+            if not counts:
+                print("No tags yet.")
+            for tag, count in counts.items():
+                print(f"- {tag} ({count} tasks)")
+                
+        elif choice == '2':
+            task_id = input("Enter task ID: ").strip()
+            add = input("Tags to add (comma separated): ").split(",")
+            remove = input("Tags to remove (comma separated): ").split(",")
+            task = self.config.tag_task(task_id, add, remove)
+            if task:
+                print(f"Task '{task.title}' tags: {', '.join(task.tags) or '-'}")
+                
+        elif choice == '3':
+            query = input("Query: ").strip()
+            try:
+                tasks = self.config.find_tasks(query)
+                counts = self.config.tag_counts(query)
+            except ValueError as e:
+                print(f"Invalid query: {e}")
+                tasks, counts = [], {}
+            for task in tasks:
+                status = "✅ Completed" if task.completed else "❌ Pending"
+                print(f"- [{task.id}] {task.title} ({status}) {' '.join('#' + tag for tag in task.tags)}")
+            print(f"{len(tasks)} tasks found.")
+            for tag, count in counts.items():
+                print(f"  #{tag}: {count}")
+        
+        self.pause()
+
+    def manage_dependencies(self):
+        """Tasks waiting for other tasks"""
+        self.clear_screen()
+        print("🔗 Dependencies")
+        print("=" * 20)
+        print("1️⃣  Ready tasks")
+        print("2️⃣  Make a task wait for another")
+        print("3️⃣  Remove a dependency")
+        print("4️⃣  Show what a task is waiting for")
+        print("5️⃣  Order of work")
+        print("6️⃣  Critical path")
+        print("0️⃣  Exit")
+        print("=" * 20)
+        
+        choice = input("Select option: ").strip()
+        
+        if choice == '1':
+            tasks = self.config.get_ready_tasks()
+            if not tasks:
+                print("No tasks are ready.")
+            for task in tasks:
+                print(f"- [{task.id}] {task.title}")
+                
+        elif choice in ('2', '3'):
+            task_id = input("Enter task ID: ").strip()
+            blocker_id = input("Enter ID of the task it waits for: ").strip()
+            try:
+                if choice == '2':
+                    task = self.config.add_dependency(task_id, blocker_id)
+                else:
+                    task = self.config.remove_dependency(task_id, blocker_id)
+            except ValueError as e:
+                print(f"❌ {e}")
+                task = None
+            if task:
+                print(f"Task '{task.title}' now waits for: {', '.join(task.blocked_by) or '-'}")
+                
+        elif choice == '4':
+            task_id = input("Enter task ID: ").strip()
+            blockers = self.config.get_blockers(task_id)
+            if not blockers:
+                print("Nothing to wait for.")
+            for task in blockers:
+                print(f"- [{task.id}] {task.title}")
+                
+        elif choice in ('5', '6'):
+            try:
+                tasks = self.config.topological_order() if choice == '5' else self.config.critical_path()
+            except ValueError as e:
+                print(f"❌ {e}")
+                tasks = []
+            for number, task in enumerate(tasks, 1):
+                status = "✅" if task.completed else "❌"
+                print(f"{number}. {status} [{task.id}] {task.title}")
+        
+        self.pause()
+
+    def undo(self):
+        """Undo the last change"""
+        if self.config.undo():
+            print("↩️  Last change undone.")
+        self.pause()
+
+    def redo(self):
+        """Redo the last undone change"""
+        if self.config.redo():
+            print("↪️  Change redone.")
+        self.pause()
     
 if __name__ == "__main__":
-    app = CliApp()
+    try:
+        app = CliApp()
+    except UnsupportedVersionError:
+        # Already reported, and the file is left as it was
+        sys.exit(1)
     try:
         app.run()
     except KeyboardInterrupt:
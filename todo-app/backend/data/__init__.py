@@ -1,3 +1,3 @@
-from backend.data.basemodels import TodoModel, SectionModel, TaskModel
+from backend.data.basemodels import TodoModel, SectionModel, TaskModel, construct, trusted_values, naive_local, parse_datetime
 from backend.data.section import Section
 from backend.data.task import Task
\ No newline at end of file
@@ -1,14 +1,26 @@
 from pydantic import BaseModel, Field
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional, Set, Tuple, Type
 from datetime import datetime
+from functools import lru_cache
 import uuid
 
+# Version written by this code; older files are upgraded by backend.migrations
+SCHEMA_VERSION = "2.0"
+
 class TaskModel(BaseModel):
     id: str = Field(default_factory=lambda: str(uuid.uuid4())[:8])
     title: str
     description: str = ""
     completed: bool = False
     subtasks: List['TaskModel'] = Field(default_factory=list)
+    due_at: Optional[datetime] = None
+    priority: Optional[int] = None
+    tags: List[str] = Field(default_factory=list)
+    blocked_by: List[str] = Field(default_factory=list)
+    recurrence: Optional[str] = None
+    # Due date the recurrence was set against; monthly/yearly occurrences keep its day
+    recurrence_anchor: Optional[datetime] = None
+    deleted_at: Optional[datetime] = None
     created_at: datetime = Field(default_factory=datetime.now)
     updated_at: datetime = Field(default_factory=datetime.now)
 
@@ -19,8 +31,53 @@ class SectionModel(BaseModel):
     updated_at: datetime = Field(default_factory=datetime.now)
 
 class TodoModel(BaseModel):
-    version: str = "1.0"
+    version: str = SCHEMA_VERSION
     created_at: datetime = Field(default_factory=datetime.now)
     last_updated: datetime = Field(default_factory=datetime.now)
     settings: Dict[str, Any] = Field(default_factory=dict)
     sections: List['SectionModel'] = Field(default_factory=list)
+
+
+@lru_cache(maxsize=None)
+def datetime_fields(model: Type[BaseModel]) -> Tuple[str, ...]:
+    """Names of a model's datetime fields"""
+    return tuple(name for name, field in model.model_fields.items()
+                 if field.annotation in (datetime, Optional[datetime]))
+
+@lru_cache(maxsize=None)
+def _field_names(model: Type[BaseModel]) -> frozenset:
+    return frozenset(model.model_fields)
+
+@lru_cache(maxsize=None)
+def _private_defaults(model: Type[BaseModel]) -> Tuple[Tuple[str, Any], ...]:
+    return tuple((name, attr.get_default()) for name, attr in (model.__private_attributes__ or {}).items())
+
+def construct(model: Type[BaseModel], values: Dict[str, Any], fields_set: Optional[Set[str]] = None):
+    """model_construct without its per-field bookkeeping when every field is present"""
+    if values.keys() != _field_names(model):
+        return model.model_construct(_fields_set=fields_set, **values)
+    obj = model.__new__(model)
+    object.__setattr__(obj, '__dict__', values)
+    object.__setattr__(obj, '__pydantic_fields_set__', set(values) if fields_set is None else set(fields_set))
+    object.__setattr__(obj, '__pydantic_extra__', None)
+    private = _private_defaults(model)
+    object.__setattr__(obj, '__pydantic_private__', dict(private) if private else None)
+    return obj
+
+def naive_local(value: Optional[datetime]) -> Optional[datetime]:
+    """Convert a timezone-aware datetime to naive local time, the form every stored date uses"""
+    if value is not None and value.tzinfo is not None:
+        return value.astimezone().replace(tzinfo=None)
+    return value
+
+def parse_datetime(text: str) -> datetime:
+    """Parse an ISO date/time (with or without an offset) into naive local time"""
+    return naive_local(datetime.fromisoformat(text))
+
+def trusted_values(model: Type[BaseModel], data: Dict[str, Any]) -> Dict[str, Any]:
+    """Field values for construct() from data written by save_to_file (parsed in place, no validation)"""
+    for name in datetime_fields(model):
+        value = data.get(name)
+        if value.__class__ is str:
+            data[name] = datetime.fromisoformat(value)
+    return data
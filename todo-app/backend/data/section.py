@@ -1,8 +1,19 @@
+from typing import Any, Dict, List
+from pydantic import Field
+
 from .task import Task
-from . import SectionModel
+from . import SectionModel, construct, trusted_values
 
 
 class Section(SectionModel):
+    tasks: List[Task] = Field(default_factory=list)
+
+    @classmethod
+    def from_trusted(cls, data: Dict[str, Any]) -> 'Section':
+        """Build a section (and its tasks) from data we saved ourselves, skipping validation"""
+        values = trusted_values(cls, data)
+        values["tasks"] = [Task.from_trusted(task) for task in values.get("tasks", ())]
+        return construct(cls, values)
     
     def add_task(self, task):
         if isinstance(task, Task):
@@ -12,11 +23,14 @@ class Section(SectionModel):
         if task in self.tasks:
             self.tasks.remove(task)
     
+    def get_active_tasks(self):
+        return [task for task in self.tasks if not task.deleted_at]
+    
     def get_completed_tasks(self):
-        return [task for task in self.tasks if task.completed]
+        return [task for task in self.tasks if task.completed and not task.deleted_at]
     
     def get_pending_tasks(self):
-        return [task for task in self.tasks if not task.completed]
+        return [task for task in self.tasks if not task.completed and not task.deleted_at]
     
     
 
@@ -1,22 +1,140 @@
-from datetime import datetime
+from datetime import datetime, timedelta
+from typing import Any, Callable, Dict, Iterable, List, Optional
+from pydantic import Field, PrivateAttr, field_validator
 
-from . import TaskModel
+from . import TaskModel, construct, naive_local, trusted_values
+
+
+def normalize_tag(tag: str) -> str:
+    """Lowercase a tag and turn inner whitespace into dashes ("Needs Review" -> "needs-review")"""
+    return "-".join(tag.lower().split())
+
+def normalize_tags(tags: Iterable[str]) -> List[str]:
+    """Normalize tags, dropping empty ones and duplicates (order is kept)"""
+    return list(dict.fromkeys(tag for tag in map(normalize_tag, tags) if tag))
 
 
 class Task(TaskModel):  
+    # Validate straight into Task objects
+    subtasks: List['Task'] = Field(default_factory=list)
+    # Set by the owning Todo so its indexes follow every change
+    _on_update: Optional[Callable[['Task'], None]] = PrivateAttr(default=None)
+    # Set by the owning Todo to attach/detach subtasks itself: (parent, subtask, added)
+    _on_subtask: Optional[Callable[['Task', 'Task', bool], None]] = PrivateAttr(default=None)
+
+    @field_validator("tags")
+    @classmethod
+    def _normalize_tags(cls, tags: List[str]) -> List[str]:
+        return normalize_tags(tags)
+
+    @field_validator("due_at")
+    @classmethod
+    def _naive_due(cls, due_at: Optional[datetime]) -> Optional[datetime]:
+        # Aware dates can't be compared with the naive ones in the schedule
+        return naive_local(due_at)
+
+    @classmethod
+    def from_trusted(cls, data: Dict[str, Any]) -> 'Task':
+        """Build a task (and subtasks) from data we saved ourselves, skipping validation"""
+        values = trusted_values(cls, data)
+        subtasks = values.get("subtasks")
+        values["subtasks"] = [cls.from_trusted(subtask) for subtask in subtasks] if subtasks else []
+        return construct(cls, values)
           
     def update_title(self, new_title: str):
         self.title = new_title
         self.update_timestamp()
         return self
 
+    def update_description(self, new_description: str):
+        self.description = new_description
+        self.update_timestamp()
+        return self
+
+    def set_due(self, due_at: Optional[datetime]):
+        self.due_at = naive_local(due_at)
+        if self.recurrence:
+            # Moving a recurring task starts the series over from the new date
+            self.recurrence_anchor = self.due_at
+        self.update_timestamp()
+        return self
+
+    def set_priority(self, priority: Optional[int]):
+        self.priority = priority
+        self.update_timestamp()
+        return self
+
+    def add_tag(self, tag: str):
+        tag = normalize_tag(tag)
+        if tag and tag not in self.tags:
+            self.tags.append(tag)
+            self.update_timestamp()
+        return self
+
+    def remove_tag(self, tag: str):
+        tag = normalize_tag(tag)
+        if tag in self.tags:
+            self.tags.remove(tag)
+            self.update_timestamp()
+        return self
+
+    def set_tags(self, tags: Iterable[str]):
+        self.tags = normalize_tags(tags)
+        self.update_timestamp()
+        return self
+
+    def add_blocker(self, task_id: str):
+        if task_id not in self.blocked_by:
+            self.blocked_by.append(task_id)
+            self.update_timestamp()
+        return self
+
+    def remove_blocker(self, task_id: str):
+        if task_id in self.blocked_by:
+            self.blocked_by.remove(task_id)
+            self.update_timestamp()
+        return self
+
+    def set_recurrence(self, rule: Optional[str]):
+        self.recurrence = rule
+        self.recurrence_anchor = self.due_at if rule else None
+        self.update_timestamp()
+        return self
+
+    def repeated(self, shift: timedelta) -> 'Task':
+        """A new pending copy of this task (and its subtasks) with due dates moved by shift"""
+        return Task(
+            title=self.title,
+            description=self.description,
+            priority=self.priority,
+            tags=list(self.tags),
+            due_at=self.due_at + shift if self.due_at else None,
+            recurrence=self.recurrence,
+            recurrence_anchor=self.recurrence_anchor,
+            subtasks=[subtask.repeated(shift) for subtask in self.subtasks],
+        )
+
     def add_subtask(self, subtask: 'Task'):
         if isinstance(subtask, Task):
+            if self._on_subtask:
+                self._on_subtask(self, subtask, True)
+                return
             self.subtasks.append(subtask)
             self.update_timestamp()
+
+    def remove_subtask(self, subtask: 'Task'):
+        if self._on_subtask:
+            if any(item is subtask for item in self.subtasks):
+                self._on_subtask(self, subtask, False)
+            return
+        if subtask in self.subtasks:
+            self.subtasks.remove(subtask)
+            self.update_timestamp()
     
     def update_timestamp(self):
         self.updated_at = datetime.now()
+        if self._on_update:
+            self._on_update(self)
    
     def complete(self):
         self.completed = True
@@ -28,6 +146,16 @@ class Task(TaskModel):
         self.update_timestamp()
         return self
            
+    def soft_delete(self):
+        self.deleted_at = datetime.now()
+        self.update_timestamp()
+        return self
+
+    def restore(self):
+        self.deleted_at = None
+        self.update_timestamp()
+        return self
+           
     def is_fully_complete(self) -> bool:
         return self.completed and all(subtask.completed for subtask in self.subtasks)
     
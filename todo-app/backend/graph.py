@@ -0,0 +1,143 @@
+from collections import deque
+from typing import Dict, FrozenSet, Iterable, List, Set
+
+
+class DependencyGraph:
+    """Blocked-by edges between task ids, with the set of ready tasks kept up to date
+
+    A task is pending until it is completed (or trashed); pending tasks block
+    the tasks that depend on them. Ids of tasks that aren't in the graph never
+    block, so dependents of an archived or purged task become ready.
+    """
+
+    def __init__(self):
+        self._blockers: Dict[str, FrozenSet[str]] = {}
+        self._dependents: Dict[str, Set[str]] = {}
+        self._pending: Set[str] = set()
+        # Number of pending blockers of every task
+        self._open: Dict[str, int] = {}
+        # Pending tasks with no pending blockers
+        self.ready: Set[str] = set()
+
+    def __len__(self) -> int:
+        return len(self._blockers)
+
+    def __contains__(self, item_id: str) -> bool:
+        return item_id in self._blockers
+
+    def update(self, item_id: str, blockers: Iterable[str], pending: bool):
+        """Add a task or sync it after its blockers or completion changed"""
+        old = self._blockers.get(item_id, frozenset())
+        new = frozenset(blockers)
+        self._blockers[item_id] = new
+        count = self._open.get(item_id, 0)
+        for blocker in old - new:
+            self._dependents[blocker].discard(item_id)
+            if not self._dependents[blocker]:
+                del self._dependents[blocker]
+            if blocker in self._pending:
+                count -= 1
+        for blocker in new - old:
+            self._dependents.setdefault(blocker, set()).add(item_id)
+            if blocker in self._pending:
+                count += 1
+        self._open[item_id] = count
+        self._set_pending(item_id, pending)
+        self._update_ready(item_id)
+
+    def remove(self, item_id: str) -> bool:
+        """Drop a task (its dependents stop being blocked by it)"""
+        if item_id not in self._blockers:
+            return False
+        self.update(item_id, (), False)
+        del self._blockers[item_id]
+        del self._open[item_id]
+        return True
+
+    def clear(self):
+        self._blockers.clear()
+        self._dependents.clear()
+        self._pending.clear()
+        self._open.clear()
+        self.ready.clear()
+
+    def _set_pending(self, item_id: str, pending: bool):
+        """Flip a task's state and adjust the counts of the tasks it blocks"""
+        if pending == (item_id in self._pending):
+            return
+        if pending:
+            self._pending.add(item_id)
+            step = 1
+        else:
+            self._pending.discard(item_id)
+            step = -1
+        for dependent in self._dependents.get(item_id, ()):
+            if dependent in self._open:
+                self._open[dependent] += step
+                self._update_ready(dependent)
+
+    def _update_ready(self, item_id: str):
+        if item_id in self._pending and self._open.get(item_id) == 0:
+            self.ready.add(item_id)
+        else:
+            self.ready.discard(item_id)
+
+    def blockers(self, item_id: str) -> List[str]:
+        """Pending blockers of a task"""
+        return [blocker for blocker in self._blockers.get(item_id, ()) if blocker in self._pending]
+
+    def would_cycle(self, item_id: str, blocker_id: str) -> bool:
+        """Check if making a task wait for a blocker would close a cycle"""
+        # A cycle means the blocker already waits (transitively) for the task
+        seen = {blocker_id}
+        stack = [blocker_id]
+        while stack:
+            current = stack.pop()
+            if current == item_id:
+                return True
+            for blocker in self._blockers.get(current, ()):
+                if blocker not in seen:
+                    seen.add(blocker)
+                    stack.append(blocker)
+        return False
+
+    def topological_order(self) -> List[str]:
+        """Every task after all of its blockers (raises ValueError on a cycle)"""
+        waiting = {item_id: sum(1 for b in blockers if b in self._blockers)
+                   for item_id, blockers in self._blockers.items()}
+        queue = deque(item_id for item_id, count in waiting.items() if count == 0)
+        order = []
+        while queue:
+            current = queue.popleft()
+            order.append(current)
+            for dependent in self._dependents.get(current, ()):
+                if dependent in waiting:
+                    waiting[dependent] -= 1
+                    if waiting[dependent] == 0:
+                        queue.append(dependent)
+        if len(order) != len(waiting):
+            stuck = sorted(item_id for item_id, count in waiting.items() if count > 0)
+            raise ValueError(f"Dependency cycle between tasks: {', '.join(stuck)}")
+        return order
+
+    def critical_path(self) -> List[str]:
+        """Longest chain of pending tasks, each blocking the next"""
+        length: Dict[str, int] = {}
+        previous: Dict[str, str] = {}
+        for item_id in self.topological_order():
+            if item_id not in self._pending:
+                continue
+            best = 0
+            for blocker in self._blockers[item_id]:
+                if length.get(blocker, 0) > best:
+                    best = length[blocker]
+                    previous[item_id] = blocker
+            length[item_id] = best + 1
+        if not length:
+            return []
+        current = max(length, key=length.get)
+        path = [current]
+        while current in previous:
+            current = previous[current]
+            path.append(current)
+        return path[::-1]
@@ -0,0 +1,113 @@
+import json
+from collections import deque
+from pathlib import Path
+from typing import Any, Deque, Dict, Optional, Sequence, Tuple
+
+# An operation is a small JSON-friendly dict, e.g. {"op": "remove_task", "id": "1a2b3c4d"}
+Operation = Dict[str, Any]
+
+
+class History:
+    """Bounded undo/redo stacks of inverse operations"""
+
+    def __init__(self, max_steps: int = 100, max_bytes: Optional[int] = None):
+        self.max_steps = max_steps
+        self.max_bytes = max_bytes
+        # (operation, approximate size in bytes)
+        self.undo_stack: Deque[Tuple[Operation, int]] = deque()
+        self.redo_stack: Deque[Tuple[Operation, int]] = deque()
+        self.size = 0
+
+    def __len__(self) -> int:
+        return len(self.undo_stack)
+
+    def _measure(self, op: Operation) -> int:
+        """Approximate memory of an operation (only when a byte budget is set)"""
+        if self.max_bytes is None:
+            return 0
+        return len(json.dumps(op, default=str))
+
+    def _push(self, stack: Deque[Tuple[Operation, int]], op: Operation):
+        size = self._measure(op)
+        stack.append((op, size))
+        self.size += size
+        self._trim()
+
+    def _pop(self, stack: Deque[Tuple[Operation, int]]) -> Optional[Operation]:
+        if not stack:
+            return None
+        op, size = stack.pop()
+        self.size -= size
+        return op
+
+    def _trim(self):
+        """Drop the oldest undo steps until both limits hold"""
+        while self.undo_stack and (
+            len(self.undo_stack) > self.max_steps
+            or (self.max_bytes is not None and self.size > self.max_bytes)
+        ):
+            _, size = self.undo_stack.popleft()
+            self.size -= size
+        while self.redo_stack and self.max_bytes is not None and self.size > self.max_bytes:
+            _, size = self.redo_stack.popleft()
+            self.size -= size
+
+    def record(self, op: Operation):
+        """Record the inverse of a new change (clears the redo stack)"""
+        for _, size in self.redo_stack:
+            self.size -= size
+        self.redo_stack.clear()
+        self._push(self.undo_stack, op)
+
+    def push_undo(self, op: Operation):
+        self._push(self.undo_stack, op)
+
+    def push_redo(self, op: Operation):
+        self._push(self.redo_stack, op)
+
+    def pop_undo(self) -> Optional[Operation]:
+        return self._pop(self.undo_stack)
+
+    def pop_redo(self) -> Optional[Operation]:
+        return self._pop(self.redo_stack)
+
+    def can_undo(self) -> bool:
+        return bool(self.undo_stack)
+
+    def can_redo(self) -> bool:
+        return bool(self.redo_stack)
+
+    def clear(self):
+        self.undo_stack.clear()
+        self.redo_stack.clear()
+        self.size = 0
+
+# ======= persistence ========
+
+    def save(self, path: Path, data_version: Optional[Sequence[int]] = None):
+        """Save both stacks to a JSON file, with the version of the data file they apply to"""
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump({
+                "data_version": list(data_version) if data_version is not None else None,
+                "undo": [op for op, _ in self.undo_stack],
+                "redo": [op for op, _ in self.redo_stack],
+            }, f, ensure_ascii=False, default=str)
+
+    def load(self, path: Path, data_version: Optional[Sequence[int]] = None):
+        """Load both stacks from a JSON file (missing or broken files are ignored)
+
+        With a data_version, stacks saved against any other version of the
+        data file (changed since, replaced, restored from a backup) are dropped.
+        """
+        self.clear()
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except (OSError, json.JSONDecodeError):
+            return
+        if data_version is not None and data.get("data_version") != list(data_version):
+            return
+        for op in data.get("undo", []):
+            self.push_undo(op)
+        for op in data.get("redo", []):
+            self.push_redo(op)
@@ -0,0 +1,272 @@
+import re
+from bisect import bisect_left, insort
+from contextlib import contextmanager
+from typing import Any, Dict, FrozenSet, Iterable, Iterator, List, Optional, Tuple
+
+from .data.task import normalize_tag
+
+
+class SortedIndex:
+    """Ids kept sorted by a tuple key, for range queries without full scans"""
+
+    def __init__(self):
+        self._entries: List[Tuple[Any, ...]] = []
+        self._keys: Dict[str, Tuple[Any, ...]] = {}
+        # While bulk loading, entries are appended and sorted once at the end
+        self._bulk = False
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __contains__(self, item_id: str) -> bool:
+        return item_id in self._keys
+
+    def add(self, item_id: str, key: Tuple[Any, ...]):
+        """Insert or move an id to the position of its key"""
+        if item_id in self._keys:
+            self.remove(item_id)
+        if self._bulk:
+            self._entries.append(key + (item_id,))
+        else:
+            insort(self._entries, key + (item_id,))
+        # Only once the entry is in (insort raises on keys that don't compare)
+        self._keys[item_id] = key
+
+    def remove(self, item_id: str) -> bool:
+        """Remove an id (returns False if it wasn't indexed)"""
+        key = self._keys.pop(item_id, None)
+        if key is None:
+            return False
+        if self._bulk:
+            self._entries.remove(key + (item_id,))
+        else:
+            del self._entries[bisect_left(self._entries, key + (item_id,))]
+        return True
+
+    @contextmanager
+    def bulk(self):
+        """Defer sorting while adding many ids (one sort instead of n inserts)"""
+        self._bulk = True
+        try:
+            yield self
+        finally:
+            self._bulk = False
+            self._entries.sort()
+
+    def clear(self):
+        """Drop all entries"""
+        self._entries.clear()
+        self._keys.clear()
+
+    def key_of(self, item_id: str) -> Optional[Tuple[Any, ...]]:
+        """Get the key an id is indexed under"""
+        return self._keys.get(item_id)
+
+    def head(self, n: int) -> List[str]:
+        """Get the n ids with the smallest keys"""
+        return [entry[-1] for entry in self._entries[:max(n, 0)]]
+
+    def tail(self, n: int) -> List[str]:
+        """Get the n ids with the largest keys, largest first"""
+        if n <= 0:
+            return []
+        return [entry[-1] for entry in reversed(self._entries[-n:])]
+
+    def between(self, start: Optional[Tuple[Any, ...]] = None,
+                end: Optional[Tuple[Any, ...]] = None) -> List[str]:
+        """Get ids with start <= key < end (either bound may be omitted)"""
+        lo = 0 if start is None else bisect_left(self._entries, start)
+        hi = len(self._entries) if end is None else bisect_left(self._entries, end)
+        return [entry[-1] for entry in self._entries[lo:hi]]
+
+
+# Words, parentheses and tag:names of a tag query
+_QUERY_TOKEN = re.compile(r"\s*(\(|\)|[^\s()]+)")
+
+
+class TagIndex:
+    """Tag -> bitset of task slots, for set-algebra queries over tags
+
+    Every indexed task gets a small integer slot, and each tag (plus "completed")
+    is a Python int with the bits of its tasks set, so AND/OR/NOT are single
+    bitwise operations however many tasks match.
+    """
+
+    def __init__(self):
+        self._slots: Dict[str, int] = {}
+        self._ids: List[Optional[str]] = []
+        self._free: List[int] = []
+        # Tags and completed flag of every slot, to know which bits to flip on change
+        self._state: Dict[int, Tuple[FrozenSet[str], bool]] = {}
+        self._masks: Dict[str, int] = {}
+        self._completed = 0
+        self._all = 0
+        # While bulk loading, only _state is kept and the masks are built once at the end
+        self._bulk = False
+
+    def __len__(self) -> int:
+        return len(self._slots)
+
+    def __contains__(self, item_id: str) -> bool:
+        return item_id in self._slots
+
+    def update(self, item_id: str, tags: Iterable[str], completed: bool):
+        """Index an id (or re-index it after its tags or completion changed)"""
+        slot = self._slots.get(item_id)
+        if slot is None:
+            slot = self._free.pop() if self._free else len(self._ids)
+            if slot == len(self._ids):
+                self._ids.append(item_id)
+            else:
+                self._ids[slot] = item_id
+            self._slots[item_id] = slot
+            old_tags, old_completed = frozenset(), False
+            if not self._bulk:
+                self._all |= 1 << slot
+        else:
+            old_tags, old_completed = self._state[slot]
+        new_tags = frozenset(tags)
+        self._state[slot] = (new_tags, completed)
+        if self._bulk:
+            return
+
+        bit = 1 << slot
+        for tag in old_tags - new_tags:
+            mask = self._masks[tag] & ~bit
+            if mask:
+                self._masks[tag] = mask
+            else:
+                del self._masks[tag]
+        for tag in new_tags - old_tags:
+            self._masks[tag] = self._masks.get(tag, 0) | bit
+        if completed != old_completed:
+            self._completed ^= bit
+
+    def remove(self, item_id: str) -> bool:
+        """Remove an id (returns False if it wasn't indexed)"""
+        if item_id not in self._slots:
+            return False
+        self.update(item_id, (), False)
+        slot = self._slots.pop(item_id)
+        del self._state[slot]
+        self._ids[slot] = None
+        self._free.append(slot)
+        if not self._bulk:
+            self._all &= ~(1 << slot)
+        return True
+
+    @contextmanager
+    def bulk(self):
+        """Defer building the bitsets while adding many ids"""
+        self._bulk = True
+        try:
+            yield self
+        finally:
+            self._bulk = False
+            self._rebuild()
+
+    def _rebuild(self):
+        size = len(self._ids) // 8 + 1
+        bits: Dict[str, bytearray] = {}
+        completed = bytearray(size)
+        everything = bytearray(size)
+        for slot, (tags, done) in self._state.items():
+            byte, bit = slot >> 3, 1 << (slot & 7)
+            everything[byte] |= bit
+            if done:
+                completed[byte] |= bit
+            for tag in tags:
+                if tag not in bits:
+                    bits[tag] = bytearray(size)
+                bits[tag][byte] |= bit
+        self._masks = {tag: int.from_bytes(b, "little") for tag, b in bits.items()}
+        self._completed = int.from_bytes(completed, "little")
+        self._all = int.from_bytes(everything, "little")
+
+    def clear(self):
+        """Drop all entries"""
+        self._slots.clear()
+        self._ids.clear()
+        self._free.clear()
+        self._state.clear()
+        self._masks.clear()
+        self._completed = self._all = 0
+
+    def ids(self, mask: int) -> Iterator[str]:
+        """Ids of the slots set in a mask"""
+        # bin() and str.find skip the unset bits at C speed
+        bits = bin(mask)[:1:-1]
+        slot = bits.find("1")
+        while slot != -1:
+            yield self._ids[slot]
+            slot = bits.find("1", slot + 1)
+
+    def tags(self) -> List[str]:
+        """All tags in use, sorted"""
+        return sorted(self._masks)
+
+    def counts(self, within: Optional[int] = None) -> Dict[str, int]:
+        """Number of ids per tag (optionally only those in a query result mask)"""
+        if within is None:
+            return {tag: mask.bit_count() for tag, mask in sorted(self._masks.items())}
+        counts = {tag: (mask & within).bit_count() for tag, mask in sorted(self._masks.items())}
+        return {tag: count for tag, count in counts.items() if count}
+
+    def query(self, text: str) -> int:
+        """Evaluate a query to a mask, e.g. "tag:urgent AND tag:backend NOT completed"
+
+        Terms are tag:<name> (or a bare name), completed, pending and all; they
+        combine with AND, OR, NOT and parentheses, and adjacent terms mean AND.
+        Raises ValueError on a malformed query.
+        """
+        tokens = _QUERY_TOKEN.findall(text)
+        if not tokens:
+            raise ValueError("Empty query")
+        mask, pos = self._parse_or(tokens, 0)
+        if pos != len(tokens):
+            raise ValueError(f"Unexpected '{tokens[pos]}' in query")
+        return mask
+
+    def _parse_or(self, tokens: List[str], pos: int) -> Tuple[int, int]:
+        mask, pos = self._parse_and(tokens, pos)
+        while pos < len(tokens) and tokens[pos].upper() == "OR":
+            right, pos = self._parse_and(tokens, pos + 1)
+            mask |= right
+        return mask, pos
+
+    def _parse_and(self, tokens: List[str], pos: int) -> Tuple[int, int]:
+        mask, pos = self._parse_not(tokens, pos)
+        while pos < len(tokens) and tokens[pos].upper() != "OR" and tokens[pos] != ")":
+            if tokens[pos].upper() == "AND":
+                pos += 1
+            right, pos = self._parse_not(tokens, pos)
+            mask &= right
+        return mask, pos
+
+    def _parse_not(self, tokens: List[str], pos: int) -> Tuple[int, int]:
+        if pos < len(tokens) and tokens[pos].upper() == "NOT":
+            mask, pos = self._parse_not(tokens, pos + 1)
+            return self._all & ~mask, pos
+        return self._parse_term(tokens, pos)
+
+    def _parse_term(self, tokens: List[str], pos: int) -> Tuple[int, int]:
+        if pos >= len(tokens):
+            raise ValueError("Query ends early")
+        token = tokens[pos]
+        if token == "(":
+            mask, pos = self._parse_or(tokens, pos + 1)
+            if pos >= len(tokens) or tokens[pos] != ")":
+                raise ValueError("Missing ')' in query")
+            return mask, pos + 1
+        word = token.lower()
+        if word in ("and", "or", "not", ")"):
+            raise ValueError(f"Unexpected '{token}' in query")
+        if word == "completed":
+            return self._completed, pos + 1
+        if word == "pending":
+            return self._all & ~self._completed, pos + 1
+        if word == "all":
+            return self._all, pos + 1
+        if word.startswith("tag:"):
+            word = word[4:]
+        return self._masks.get(normalize_tag(word), 0), pos + 1
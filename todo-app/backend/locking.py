@@ -0,0 +1,118 @@
+import threading
+import time
+from pathlib import Path
+from typing import IO, Any, Dict, Optional
+
+from .metrics import metrics
+
+try:
+    import fcntl
+except ImportError:
+    # No flock on Windows: the lock only covers threads there
+    fcntl = None
+
+
+class StoreLock:
+    """Reentrant lock around a store that counts how often (and how long) callers wait
+
+    With a path, the outermost acquire also takes an exclusive flock on that
+    file, so processes sharing the store (CLI + API) take turns as well.
+    """
+
+    def __init__(self, path: Optional[Path] = None):
+        self.path = path
+        self._lock = threading.RLock()
+        self._depth = 0
+        self._file = None
+        self._acquired_at = 0.0
+        self.reset_stats()
+
+    def reset_stats(self):
+        self.acquisitions = 0
+        self.contended = 0
+        self.wait_seconds = 0.0
+        self.max_wait_seconds = 0.0
+        self.held_seconds = 0.0
+
+    def acquire(self):
+        start = time.perf_counter()
+        contended = not self._lock.acquire(blocking=False)
+        if contended:
+            self._lock.acquire()
+        # Counters are only touched while holding the lock
+        self._depth += 1
+        if self._depth > 1:
+            return
+        if self.path is not None and fcntl is not None:
+            try:
+                # The store's directory may not exist before its first save
+                self.path.parent.mkdir(parents=True, exist_ok=True)
+                self._file = open(self.path, 'a')
+                if not contended:
+                    try:
+                        fcntl.flock(self._file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                    except BlockingIOError:
+                        contended = True
+                if contended:
+                    fcntl.flock(self._file, fcntl.LOCK_EX)
+            except BaseException:
+                self._release_file()
+                self._depth -= 1
+                self._lock.release()
+                raise
+        self._acquired_at = time.perf_counter()
+        waited = self._acquired_at - start
+        self.acquisitions += 1
+        if contended:
+            self.contended += 1
+            self.wait_seconds += waited
+            self.max_wait_seconds = max(self.max_wait_seconds, waited)
+            metrics.observe("todo_lock_wait_seconds", waited)
+
+    def release(self):
+        self._depth -= 1
+        if self._depth == 0:
+            self.held_seconds += time.perf_counter() - self._acquired_at
+            self._release_file()
+        self._lock.release()
+
+    def _release_file(self):
+        if self._file is not None:
+            # Closing the file drops the flock
+            self._file.close()
+            self._file = None
+
+    def __enter__(self):
+        self.acquire()
+        return self
+
+    def __exit__(self, *exc):
+        self.release()
+        return False
+
+    def stats(self) -> Dict[str, Any]:
+        """Acquisitions, how many had to wait, and wait/hold times in seconds"""
+        return {
+            "acquisitions": self.acquisitions,
+            "contended": self.contended,
+            "wait_seconds": self.wait_seconds,
+            "max_wait_seconds": self.max_wait_seconds,
+            "held_seconds": self.held_seconds,
+        }
+
+
+def claim_file(path: Path) -> Optional[IO]:
+    """Take an exclusive flock on a file without waiting
+
+    Returns the open file (keep it open to keep the claim), or None if another
+    process holds it. Without flock every caller gets the claim.
+    """
+    path.parent.mkdir(parents=True, exist_ok=True)
+    f = open(path, 'a')
+    if fcntl is not None:
+        try:
+            fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            f.close()
+            return None
+    return f
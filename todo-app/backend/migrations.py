@@ -0,0 +1,381 @@
+import json
+import os
+import re
+import time
+import uuid
+from datetime import datetime
+from pathlib import Path
+from typing import IO, Any, Callable, Dict, Iterator, List, Optional
+
+from .data.basemodels import SCHEMA_VERSION
+from .metrics import metrics
+
+# Takes one piece of the document and returns it upgraded
+Transform = Callable[[Dict[str, Any]], Dict[str, Any]]
+
+# Files kept next to the store while a migration runs
+TEMP_SUFFIX = ".migrating"
+PROGRESS_SUFFIX = ".migration.json"
+
+
+class Migration:
+    """Upgrade of the store format from one version to the next
+
+    The document is transformed a piece at a time, so a transform never sees the
+    whole store: `task` gets each top-level task (with its subtasks), `section`
+    the fields of a section without its tasks and `header` the top-level fields
+    without the sections. Section and header fields may arrive in two parts
+    (those before and those after the task/section list).
+    """
+
+    def __init__(self, from_version: str, to_version: str, task: Optional[Transform] = None,
+                 section: Optional[Transform] = None, header: Optional[Transform] = None):
+        self.from_version = from_version
+        self.to_version = to_version
+        self.task = task
+        self.section = section
+        self.header = header
+
+
+# Registered migrations by the version they upgrade from
+MIGRATIONS: Dict[str, Migration] = {}
+
+
+def register(migration: Migration) -> Migration:
+    MIGRATIONS[migration.from_version] = migration
+    return migration
+
+
+class UnsupportedVersionError(ValueError):
+    """A store version no chain of migrations leads from (e.g. written by a newer release)"""
+
+
+def migration_path(version: str) -> List[Migration]:
+    """Migrations taking a store from a version to SCHEMA_VERSION (raises UnsupportedVersionError if there's no way)"""
+    steps = []
+    while version != SCHEMA_VERSION:
+        step = MIGRATIONS.get(version)
+        if step is None or len(steps) > len(MIGRATIONS):
+            raise UnsupportedVersionError(f"No migration from store version {version} to {SCHEMA_VERSION}")
+        steps.append(step)
+        version = step.to_version
+    return steps
+
+
+# ======= 1.0 -> 2.0 ========
+
+def _task_1_0_to_2_0(task: Dict[str, Any]) -> Dict[str, Any]:
+    """Fill in ids and every field added since 1.0, so all tasks have the same keys"""
+    upgraded = {"id": task.get("id") or str(uuid.uuid4())[:8]}
+    upgraded.update(task)
+    for field, default in (("description", ""), ("completed", False), ("due_at", None),
+                           ("priority", None), ("tags", []), ("blocked_by", []), ("recurrence", None),
+                           ("recurrence_anchor", None),
+                           ("deleted_at", None)):
+        upgraded.setdefault(field, default)
+    if "created_at" not in upgraded or "updated_at" not in upgraded:
+        now = datetime.now().isoformat()
+        upgraded.setdefault("created_at", now)
+        upgraded.setdefault("updated_at", now)
+    upgraded["subtasks"] = [_task_1_0_to_2_0(subtask) for subtask in task.get("subtasks") or ()]
+    return upgraded
+
+register(Migration("1.0", "2.0", task=_task_1_0_to_2_0))
+
+# ======= streaming JSON ========
+
+_WHITESPACE = re.compile(r"[ \t\r\n]*")
+
+
+class JsonStream:
+    """Reads a JSON document a piece at a time: object keys, array items or whole values"""
+
+    def __init__(self, f: IO[str], chunk_size: int = 1 << 20):
+        self.f = f
+        self.chunk_size = chunk_size
+        self.buf = ""
+        self.pos = 0
+        self.eof = False
+        self._decoder = json.JSONDecoder()
+
+    def _fill(self) -> bool:
+        if self.eof:
+            return False
+        chunk = self.f.read(self.chunk_size)
+        if not chunk:
+            self.eof = True
+            return False
+        self.buf = self.buf[self.pos:] + chunk
+        self.pos = 0
+        return True
+
+    def _peek(self) -> str:
+        """Next character that isn't whitespace ('' at the end)"""
+        while True:
+            self.pos = _WHITESPACE.match(self.buf, self.pos).end()
+            if self.pos < len(self.buf):
+                return self.buf[self.pos]
+            if not self._fill():
+                return ""
+
+    def _expect(self, char: str):
+        found = self._peek()
+        if found != char:
+            raise ValueError(f"Expected '{char}' but found '{found}'")
+        self.pos += 1
+
+    def value(self) -> Any:
+        """Read a whole value"""
+        self._peek()
+        while True:
+            try:
+                value, end = self._decoder.raw_decode(self.buf, self.pos)
+                # A number may go on in the next chunk
+                if end < len(self.buf) or self.eof:
+                    self.pos = end
+                    return value
+            except ValueError:
+                pass
+            if not self._fill():
+                # Nothing more to read: raise the real error
+                value, self.pos = self._decoder.raw_decode(self.buf, self.pos)
+                return value
+
+    def keys(self) -> Iterator[str]:
+        """Keys of an object; read each value (or stream it) before asking for the next key"""
+        self._expect("{")
+        first = True
+        while self._peek() != "}":
+            if not first:
+                self._expect(",")
+            first = False
+            key = self.value()
+            self._expect(":")
+            yield key
+        self.pos += 1
+
+    def items(self) -> Iterator[int]:
+        """Positions of an array's items; read each item before asking for the next"""
+        self._expect("[")
+        index = 0
+        while self._peek() != "]":
+            if index:
+                self._expect(",")
+            yield index
+            index += 1
+        self.pos += 1
+
+
+def read_header(path: Path) -> Dict[str, Any]:
+    """Top-level fields of a store file before its sections, without reading the rest"""
+    header = {}
+    with open(path, 'r', encoding='utf-8') as f:
+        stream = JsonStream(f, chunk_size=1 << 16)
+        for key in stream.keys():
+            if key == "sections":
+                break
+            header[key] = stream.value()
+    return header
+
+# ======= migrating files ========
+
+# One encoder for every piece (json.dumps with options builds a new one per call)
+_dumps = json.JSONEncoder(ensure_ascii=False, default=str).encode
+
+def _fields(fields: Dict[str, Any]) -> str:
+    return ", ".join(f"{_dumps(key)}: {_dumps(value)}" for key, value in fields.items())
+
+def _write_json(path: Path, data: Any):
+    """Replace a small JSON file atomically"""
+    temp = path.with_name(path.name + ".tmp")
+    with open(temp, 'w', encoding='utf-8') as f:
+        json.dump(data, f, default=str)
+    os.replace(temp, path)
+
+
+class _DocumentMigration:
+    """One streaming pass over a store file (or a section file) into a temp file that replaces it
+
+    Progress is saved every `checkpoint_every` tasks; an interrupted run continues
+    from the last checkpoint if the source file didn't change meanwhile.
+    """
+
+    def __init__(self, path: Path, steps: List[Migration], is_section: bool = False,
+                 checkpoint_every: int = 10_000):
+        self.path = path
+        self.steps = steps
+        self.is_section = is_section
+        self.checkpoint_every = checkpoint_every
+        self.temp_path = path.with_name(path.name + TEMP_SUFFIX)
+        self.progress_path = path.with_name(path.name + PROGRESS_SUFFIX)
+        self.tasks = 0
+        self._checkpointed = 0
+
+    def run(self) -> int:
+        """Migrate the file and return the number of tasks written"""
+        stat = self.path.stat()
+        self.source = {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns}
+        progress = None
+        if self.progress_path.exists() and self.temp_path.exists():
+            with open(self.progress_path, 'r', encoding='utf-8') as f:
+                progress = json.load(f)
+            if progress.get("source") != self.source or progress.get("to") != SCHEMA_VERSION:
+                progress = None
+            else:
+                print(f"Resuming migration of {self.path} from section {progress['section']}")
+
+        with open(self.path, 'r', encoding='utf-8') as src, \
+                open(self.temp_path, 'r+b' if progress else 'wb') as out:
+            if progress:
+                out.truncate(progress["offset"])
+                out.seek(progress["offset"])
+            self.out = out
+            stream = JsonStream(src)
+            if self.is_section:
+                self._section(stream, 0, progress)
+            else:
+                self._store(stream, progress)
+            out.flush()
+            os.fsync(out.fileno())
+        os.replace(self.temp_path, self.path)
+        self.progress_path.unlink(missing_ok=True)
+        return self.tasks
+
+    def _write(self, text: str):
+        self.out.write(text.encode('utf-8'))
+
+    def _checkpoint(self, section: int, task: Optional[int]):
+        """Remember how far we got (task None: the section isn't started)"""
+        self.out.flush()
+        _write_json(self.progress_path, {"source": self.source, "to": SCHEMA_VERSION, "section": section,
+                                         "task": task, "offset": self.out.tell()})
+        self._checkpointed = self.tasks
+
+    def _transform(self, kind: str, piece: Dict[str, Any]) -> Dict[str, Any]:
+        for step in self.steps:
+            transform = getattr(step, kind)
+            if transform:
+                piece = transform(piece)
+        return piece
+
+    def _header(self, fields: Dict[str, Any]) -> Dict[str, Any]:
+        fields = self._transform("header", fields)
+        # The old checksum doesn't match the new content
+        fields.pop("checksum", None)
+        fields.pop("version", None)
+        return {"version": SCHEMA_VERSION, **fields}
+
+    def _store(self, stream: JsonStream, progress: Optional[Dict[str, Any]]):
+        before, after = {}, {}
+        fields = before
+        for key in stream.keys():
+            if key != "sections":
+                fields[key] = stream.value()
+                continue
+            if not progress:
+                self._write("{" + _fields(self._header(before)) + ', "sections": [\n')
+            for index in stream.items():
+                self._section(stream, index, progress)
+            fields = after
+        if fields is before:
+            # No sections at all
+            self._write("{" + _fields(self._header(before)) + ', "sections": []}\n')
+            return
+        after = self._transform("header", after) if after else {}
+        self._write("\n]" + (", " + _fields(after) if after else "") + "}\n")
+
+    def _section(self, stream: JsonStream, index: int, progress: Optional[Dict[str, Any]]):
+        # Sections before the checkpoint are done; the one at it may be partly done
+        done = progress is not None and progress["section"] > index
+        resume_at = progress["task"] if progress and progress["section"] == index else None
+        prefix = ",\n" if index and not self.is_section else ""
+        before, after = {}, {}
+        fields = before
+        for key in stream.keys():
+            if key != "tasks":
+                fields[key] = stream.value()
+                continue
+            if not done and resume_at is None:
+                head = _fields(self._transform("section", before))
+                self._write(prefix + "{" + (head + ", " if head else "") + '"tasks": [\n')
+            for position in stream.items():
+                task = stream.value()
+                if done or (resume_at is not None and position < resume_at):
+                    continue
+                self._write((",\n" if position else "") + _dumps(self._transform("task", task)))
+                self.tasks += 1
+                if self.tasks - self._checkpointed >= self.checkpoint_every:
+                    self._checkpoint(index, position + 1)
+            fields = after
+        if done:
+            return
+        if fields is before:
+            # A section without a task list
+            self._write(prefix + "{" + _fields(self._transform("section", before)) + "}")
+        else:
+            after = self._transform("section", after) if after else {}
+            self._write("\n]" + (", " + _fields(after) if after else "") + "}")
+        if self.tasks - self._checkpointed >= self.checkpoint_every:
+            self._checkpoint(index + 1, None)
+
+
+def _migrate_sharded(path: Path, steps: List[Migration], checkpoint_every: int) -> int:
+    """Migrate every section file of a sharded store, then its manifest"""
+    with open(path, 'r', encoding='utf-8') as f:
+        manifest = json.load(f)
+    shard_dir = path.with_name(f"{path.stem}.sections")
+    progress_path = path.with_name(path.name + PROGRESS_SUFFIX)
+    progress = {"to": SCHEMA_VERSION, "done": []}
+    if progress_path.exists():
+        with open(progress_path, 'r', encoding='utf-8') as f:
+            saved = json.load(f)
+        if saved.get("to") == SCHEMA_VERSION:
+            progress = saved
+
+    tasks = 0
+    for entry in manifest.get("sections", []):
+        if entry["file"] in progress["done"] or not (shard_dir / entry["file"]).exists():
+            continue
+        tasks += _DocumentMigration(shard_dir / entry["file"], steps, True, checkpoint_every).run()
+        # A migrated section file must never be migrated twice
+        progress["done"].append(entry["file"])
+        _write_json(progress_path, progress)
+
+    sections = manifest.pop("sections", [])
+    manifest = {**_DocumentMigration(path, steps)._header(manifest), "sections": sections}
+    _write_json(path, manifest)
+    progress_path.unlink(missing_ok=True)
+    return tasks
+
+
+def migrate_file(path, checkpoint_every: int = 10_000) -> Optional[str]:
+    """Upgrade a store file to SCHEMA_VERSION in place
+
+    Returns the version it had, or None if it was already current. Raises
+    UnsupportedVersionError if no chain of migrations leads from its version.
+    """
+    path = Path(path)
+    header = read_header(path)
+    version = header.get("version", "1.0")
+    steps = migration_path(version)
+    if not steps:
+        # Left over from a run interrupted right after it replaced the file
+        path.with_name(path.name + PROGRESS_SUFFIX).unlink(missing_ok=True)
+        path.with_name(path.name + TEMP_SUFFIX).unlink(missing_ok=True)
+        return None
+
+    print(f"Migrating {path} from version {version} to {SCHEMA_VERSION}")
+    start = time.perf_counter()
+    with metrics.timer("todo_operation_seconds", op="migrate"):
+        if header.get("format") == "sharded":
+            tasks = _migrate_sharded(path, steps, checkpoint_every)
+        else:
+            tasks = _DocumentMigration(path, steps, checkpoint_every=checkpoint_every).run()
+    print(f"Migrated {tasks} tasks in {time.perf_counter() - start:.1f}s")
+    return version
+
+
+if __name__ == "__main__":
+    import sys
+    for file_name in sys.argv[1:]:
+        migrate_file(file_name)
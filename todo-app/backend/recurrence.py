@@ -0,0 +1,117 @@
+import calendar
+import heapq
+import re
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Tuple
+
+# "daily", "weekly", "monthly", "yearly" or "every <n> days/weeks/months/years"
+_ALIASES = {"daily": "day", "weekly": "week", "monthly": "month", "yearly": "year"}
+_EVERY = re.compile(r"^every\s+(?:(\d+)\s+)?(day|week|month|year)s?$")
+
+
+def parse_rule(rule: str) -> Tuple[int, str]:
+    """Split a recurrence rule into (interval, unit); raises ValueError if it isn't one"""
+    text = " ".join(rule.lower().split())
+    if text in _ALIASES:
+        return 1, _ALIASES[text]
+    match = _EVERY.match(text)
+    if not match or match.group(1) == "0":
+        raise ValueError(f"Invalid recurrence rule: '{rule}' (try daily, weekly, monthly or every 2 weeks)")
+    return int(match.group(1) or 1), match.group(2)
+
+
+def add_months(value: datetime, months: int, day: Optional[int] = None) -> datetime:
+    """Same day (or the month's last day) and time, some months later
+
+    `day` overrides value's day, so a series on the 31st that was clamped to
+    the 28th goes back to the 31st when the month has one.
+    """
+    month = value.month - 1 + months
+    year = value.year + month // 12
+    month = month % 12 + 1
+    return value.replace(year=year, month=month,
+                         day=min(day or value.day, calendar.monthrange(year, month)[1]))
+
+
+def next_occurrence(rule: str, after: datetime, anchor: Optional[datetime] = None) -> datetime:
+    """The occurrence following one at `after`; monthly and yearly ones keep the day of the series' anchor"""
+    interval, unit = parse_rule(rule)
+    if unit == "day":
+        return after + timedelta(days=interval)
+    if unit == "week":
+        return after + timedelta(weeks=interval)
+    return add_months(after, interval * (12 if unit == "year" else 1), anchor.day if anchor else None)
+
+
+def catch_up(rule: str, due_at: datetime, now: datetime, anchor: Optional[datetime] = None) -> datetime:
+    """The occurrence after due_at, or the latest one not after now if several were missed"""
+    following = next_occurrence(rule, due_at, anchor)
+    while True:
+        after = next_occurrence(rule, following, anchor)
+        if after > now:
+            return following
+        following = after
+
+
+class OccurrenceQueue:
+    """The next occurrence of every recurring task in a heap, so due ones are found without a scan"""
+
+    def __init__(self):
+        self._heap: List[Tuple[datetime, str]] = []
+        # Current entry of every id; heap entries that don't match are stale
+        self._next: Dict[str, datetime] = {}
+
+    def __len__(self) -> int:
+        return len(self._next)
+
+    def __contains__(self, item_id: str) -> bool:
+        return item_id in self._next
+
+    def update(self, item_id: str, at: datetime):
+        """Schedule (or move) the next occurrence of a recurring task"""
+        if self._next.get(item_id) == at:
+            return
+        self._next[item_id] = at
+        heapq.heappush(self._heap, (at, item_id))
+        # Don't let stale entries pile up
+        if len(self._heap) > 2 * len(self._next) + 64:
+            self._heap = [(at, item_id) for item_id, at in self._next.items()]
+            heapq.heapify(self._heap)
+
+    def remove(self, item_id: str):
+        self._next.pop(item_id, None)
+
+    def clear(self):
+        self._heap.clear()
+        self._next.clear()
+
+    def peek(self) -> Optional[datetime]:
+        """Time of the earliest scheduled occurrence"""
+        while self._heap and self._next.get(self._heap[0][1]) != self._heap[0][0]:
+            heapq.heappop(self._heap)
+        return self._heap[0][0] if self._heap else None
+
+    def pop_due(self, now: datetime) -> List[Tuple[str, datetime]]:
+        """Take every (id, time) scheduled at or before now"""
+        due = []
+        while self._heap and self._heap[0][0] <= now:
+            at, item_id = heapq.heappop(self._heap)
+            if self._next.get(item_id) == at:
+                del self._next[item_id]
+                due.append((item_id, at))
+        return due
+
+    def until(self, end: datetime) -> List[Tuple[datetime, str]]:
+        """(time, id) of the occurrences scheduled before end, earliest first, without popping"""
+        found = []
+        # Walk the heap from the root; a node's children are only later than it
+        pending = [0] if self._heap else []
+        while pending:
+            i = pending.pop()
+            at, item_id = self._heap[i]
+            if at >= end:
+                continue
+            if self._next.get(item_id) == at:
+                found.append((at, item_id))
+            pending.extend(child for child in (2 * i + 1, 2 * i + 2) if child < len(self._heap))
+        return sorted(found)
@@ -0,0 +1,125 @@
+import re
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+from .todo import Todo
+
+LIST_ID_PATTERN = re.compile(r"^[A-Za-z0-9_-]{1,64}$")
+
+
+class TodoRegistry:
+    """Maps list ids to Todo stores and keeps the most recently used ones open"""
+
+    def __init__(self, base_dir: str, max_open: int = 64, max_tasks: Optional[int] = None,
+                 paths: Optional[Dict[str, str]] = None, **todo_options):
+        self.base_dir = Path(base_dir)
+        self.max_open = max_open
+        # Budget on the total number of tasks held by open stores
+        self.max_tasks = max_tasks
+        # Fixed file locations for some ids (e.g. the original single-list file)
+        self.paths = {list_id: Path(path) for list_id, path in (paths or {}).items()}
+        self.todo_options = todo_options
+        self._open: "OrderedDict[str, Todo]" = OrderedDict()
+        self._lock = threading.RLock()
+        # Held while a list is loaded or closed, so slow file work doesn't block other lists
+        self._list_locks: Dict[str, threading.Lock] = {}
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __len__(self) -> int:
+        return len(self._open)
+
+    def __contains__(self, list_id: str) -> bool:
+        return list_id in self._open
+
+    def path_for(self, list_id: str) -> Path:
+        """Get the data file of a list"""
+        if list_id in self.paths:
+            return self.paths[list_id]
+        if not LIST_ID_PATTERN.match(list_id):
+            raise ValueError(f"Invalid list id: {list_id!r}")
+        return self.base_dir / f"{list_id}.json"
+
+    def get(self, list_id: str) -> Todo:
+        """Get the open store of a list, loading it on a cache miss"""
+        path = self.path_for(list_id)
+        with self._lock:
+            todo = self._hit(list_id)
+            if todo is not None:
+                return todo
+            list_lock = self._list_locks.setdefault(list_id, threading.Lock())
+
+        with list_lock:
+            with self._lock:
+                # Loaded by another thread while we waited
+                todo = self._hit(list_id)
+                if todo is not None:
+                    return todo
+                self.misses += 1
+            todo = Todo(str(path), **self.todo_options)
+            with self._lock:
+                self._open[list_id] = todo
+                evicted = self._evict(keep=list_id)
+        self._close_stores(evicted)
+        return todo
+
+    def _hit(self, list_id: str) -> Optional[Todo]:
+        """Get an open store and mark it recently used (call with the registry lock held)"""
+        todo = self._open.get(list_id)
+        if todo is not None:
+            self._open.move_to_end(list_id)
+            self.hits += 1
+            # Changes saved by another process are picked up by todo.transaction(), under the store lock
+        return todo
+
+    def close(self, list_id: str) -> bool:
+        """Flush and drop an open store"""
+        with self._lock:
+            todo = self._open.pop(list_id, None)
+        if todo is None:
+            return False
+        self._close_stores([(list_id, todo)])
+        return True
+
+    def close_all(self):
+        """Flush and drop every open store"""
+        with self._lock:
+            stores = list(self._open.items())
+            self._open.clear()
+        self._close_stores(stores)
+
+    def _close_stores(self, stores: List[Tuple[str, Todo]]):
+        """Close dropped stores outside the registry lock (closing waits for each store's own lock)"""
+        for list_id, todo in stores:
+            with self._lock:
+                list_lock = self._list_locks.setdefault(list_id, threading.Lock())
+            # A reopen of the same list waits until this one has saved
+            with list_lock:
+                todo.close()
+
+    def open_lists(self) -> List[str]:
+        """Get ids of open stores, least recently used first"""
+        return list(self._open)
+
+    def open_task_count(self) -> int:
+        return sum(len(todo.task_index) for todo in self._open.values())
+
+    def _evict(self, keep: str) -> List[Tuple[str, Todo]]:
+        """Drop least recently used stores until the budgets hold and return them for closing"""
+        evicted = []
+        tasks = self.open_task_count() if self.max_tasks is not None else 0
+        for list_id in list(self._open):
+            over_count = len(self._open) > self.max_open
+            over_tasks = self.max_tasks is not None and tasks > self.max_tasks
+            if not (over_count or over_tasks):
+                break
+            if list_id == keep:
+                continue
+            todo = self._open.pop(list_id)
+            tasks -= len(todo.task_index)
+            evicted.append((list_id, todo))
+            self.evictions += 1
+        return evicted
@@ -0,0 +1,81 @@
+import gzip
+import json
+import os
+import secrets
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Hashable, Optional, Tuple
+
+# Bodies smaller than this aren't worth compressing
+GZIP_MIN_BYTES = 1024
+
+
+def _new_etag_prefix():
+    global _etag_prefix
+    _etag_prefix = secrets.token_hex(4)
+
+
+# Revisions are only unique within a process; the prefix keeps ETags from a restart
+# or another worker from matching ours
+_new_etag_prefix()
+if hasattr(os, "register_at_fork"):
+    # Forked workers count revisions from the same point, each needs its own prefix
+    os.register_at_fork(after_in_child=_new_etag_prefix)
+
+
+class CachedResponse:
+    """An encoded JSON body, its gzipped copy and an ETag"""
+
+    __slots__ = ("body", "gzipped", "etag")
+
+    def __init__(self, body: bytes, gzipped: Optional[bytes], etag: str):
+        self.body = body
+        self.gzipped = gzipped
+        self.etag = etag
+
+
+class ResponseCache:
+    """Pre-encoded responses, each valid while the revision it was built from is current"""
+
+    def __init__(self, max_entries: int = 1024, encode: Callable[[Any], str] = json.dumps,
+                 precompress: bool = True):
+        self.max_entries = max_entries
+        self.encode = encode
+        self.precompress = precompress
+        self._entries: "OrderedDict[Hashable, Tuple[int, CachedResponse]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, key: Hashable, revision: int, build: Callable[[], Any]) -> CachedResponse:
+        """Get the response for a key, encoding build() if the cached one is from another revision"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] == revision:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[1]
+            self.misses += 1
+
+        body = self.encode(build()).encode('utf-8')
+        gzipped = None
+        if self.precompress and len(body) >= GZIP_MIN_BYTES:
+            gzipped = gzip.compress(body, compresslevel=6)
+        response = CachedResponse(body, gzipped, f"{_etag_prefix}-{revision}")
+
+        with self._lock:
+            # A newer revision may have been cached meanwhile, keep that one
+            current = self._entries.get(key)
+            if current is None or current[0] <= revision:
+                self._entries[key] = (revision, response)
+                self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return response
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
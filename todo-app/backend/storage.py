@@ -0,0 +1,58 @@
+import hashlib
+import json
+import os
+import re
+import threading
+from pathlib import Path
+from typing import Any, Dict
+
+# Files we write start with a checksum of the rest of the document
+CHECKSUM_PREFIX = '{\n    "checksum": "'
+CHECKSUM_LENGTH = 64
+
+
+def checksum(body: str) -> str:
+    return hashlib.sha256(body.encode('utf-8')).hexdigest()
+
+
+def dumps_checksummed(data: Dict[str, Any]) -> str:
+    """Serialize a dict as indented JSON with a leading "checksum" key"""
+    body = json.dumps(data, ensure_ascii=False, indent=4, default=str)
+    # Header key holding the checksum of the document without it
+    return f'{CHECKSUM_PREFIX}{checksum(body)}",{body[1:]}'
+
+
+def has_valid_checksum(text: str) -> bool:
+    """Check the checksum header written by dumps_checksummed"""
+    if not text.startswith(CHECKSUM_PREFIX):
+        return False
+    end = len(CHECKSUM_PREFIX) + CHECKSUM_LENGTH
+    if text[end:end + 2] != '",':
+        return False
+    return checksum("{" + text[end + 2:]) == text[len(CHECKSUM_PREFIX):end]
+
+
+def write_text(path: Path, text: str):
+    """Write a file through a temporary one, so readers never see it half written"""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    # One temporary name per process and thread, in case two writers race
+    tmp = path.with_name(f".{path.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+    try:
+        with open(tmp, 'w', encoding='utf-8') as f:
+            f.write(text)
+        os.replace(tmp, path)
+    except BaseException:
+        tmp.unlink(missing_ok=True)
+        raise
+
+
+def read_text(path: Path) -> str:
+    with open(path, 'r', encoding='utf-8') as f:
+        return f.read()
+
+
+def shard_file_name(section_name: str) -> str:
+    """A file name for a section that is safe on every OS and unique per name"""
+    slug = re.sub(r"[^A-Za-z0-9_-]+", "_", section_name).strip("_")[:40] or "section"
+    digest = hashlib.sha1(section_name.encode('utf-8')).hexdigest()[:8]
+    return f"{slug}-{digest}.json"
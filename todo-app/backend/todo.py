@@ -1,26 +1,127 @@
+import contextlib
+import functools
+import itertools
 import json
 from pathlib import Path
-from typing import List, Optional, Dict
-from datetime import datetime
-from .data import TodoModel
+import math
+from typing import Any, Iterable, List, Optional, Dict, Set, Tuple, Union
+from datetime import datetime, timedelta
+from .data import TodoModel, construct, trusted_values
 from .data import Task, Section
+from .index import SortedIndex, TagIndex
+from .graph import DependencyGraph
+from .recurrence import OccurrenceQueue, catch_up, next_occurrence, parse_rule
+from .history import History, Operation
+from .locking import StoreLock, claim_file
+from .metrics import metrics
+from .migrations import UnsupportedVersionError, migrate_file
+from .storage import dumps_checksummed, has_valid_checksum, read_text, write_text, shard_file_name
+
+# Revisions are unique across all Todo instances, so caches never confuse two stores
+_revisions = itertools.count(1)
+
+# Upcoming occurrences are expanded in memory: bound how far ahead and how many
+UPCOMING_HORIZON = timedelta(days=2 * 366)
+UPCOMING_LIMIT = 1000
+
+def needs_all_shards(method):
+    """Load every section shard before running a method that looks across sections"""
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        if self._unloaded:
+            self.load_all_shards()
+        return method(self, *args, **kwargs)
+    return wrapper
+
+def needs_task_shard(method):
+    """Load the section shard holding the task a method works on (its first argument)"""
+    @functools.wraps(method)
+    def wrapper(self, task_id, *args, **kwargs):
+        if self._unloaded and task_id not in self.task_index:
+            self._load_shard_of(task_id)
+        return method(self, task_id, *args, **kwargs)
+    return wrapper
 
 class Todo:
-    def __init__(self, file_path: str):
+    def __init__(self, file_path: str, history_limit: int = 100,
+                 history_max_bytes: Optional[int] = None, persist_history: bool = False,
+                 always_validate: bool = False, sharded: bool = False, process_lock: bool = False):
         self.file_path = Path(file_path)
+        # Held around every operation by callers sharing the store (API threads, other processes)
+        self.lock = StoreLock(self.file_path.with_name(f"{self.file_path.stem}.lock") if process_lock else None)
         self.data = TodoModel()
+        # Sharded layout: file_path is a small manifest, each section lives in its own file
+        self.sharded = sharded
+        self.shard_dir = self.file_path.with_name(f"{self.file_path.stem}.sections")
+        self.shards: Dict[str, Dict[str, Any]] = {}
+        self._unloaded: Set[str] = set()
+        # Section of every task in an unloaded shard, from the manifest (built on first lookup)
+        self._task_shards: Optional[Dict[str, str]] = None
+        self._dirty_sections: Set[str] = set()
+        self._removed_shards: Set[str] = set()
+        # Files we wrote ourselves (checksum matches) are loaded without validation
+        self.always_validate = always_validate
+        self.last_load_trusted = False
+        # Undo/redo of changes made through this object
+        self.history = History(history_limit, history_max_bytes)
+        self.persist_history = persist_history
+        self.history_path = self.file_path.with_name(f"{self.file_path.stem}.history.json")
+        # Only one process writes the history file (e.g. the API, while the CLI keeps its own in memory)
+        self._history_claim = None
+        if persist_history:
+            self._history_claim = claim_file(self.history_path.with_suffix(".lock"))
+            if self._history_claim is None:
+                self.persist_history = False
+                print(f"Undo history of {self.file_path} is saved by another process, new steps stay in memory")
         # Indexes for fast lookup
         self.task_index: Dict[str, Task] = {}
         self.section_index: Dict[str, Section] = {}
+        self.parent_index: Dict[str, Union[Section, Task]] = {}
+        # Pending tasks with a due date, ordered by (due_at, priority)
+        self.schedule_index = SortedIndex()
+        # All tasks ordered by creation and last change
+        self.created_index = SortedIndex()
+        self.updated_index = SortedIndex()
+        # Soft-deleted tasks by deletion time, waiting for compaction
+        self.deleted_index = SortedIndex()
+        # Live tasks as bitsets per tag, for tag queries
+        self.tag_index = TagIndex()
+        # Blocked-by edges between tasks and the tasks ready to start
+        self.dependencies = DependencyGraph()
+        # Next occurrence of every recurring task, earliest first
+        self.recurrences = OccurrenceQueue()
+        # Completed tasks moved out of the active file (loaded on first use)
+        self.archive_path = self.file_path.with_name(f"{self.file_path.stem}.archive.jsonl")
+        self._archive: Optional[Dict[str, Dict[str, Any]]] = None
+        # Unsaved changes made directly on Task objects / file version we last saw
+        self.dirty = False
+        self.file_version: Optional[Tuple[int, int, int]] = None
+        # Bumped on every change; sections keep the revision of their last change
+        self.revision = next(_revisions)
+        self.load_revision = self.revision
+        self.section_revisions: Dict[str, int] = {}
+        # Live (not trashed) top-level tasks of each loaded section in order, the completed ones
+        # among them, and the number of live subtasks of every task; kept up to date on every change
+        self._live_tasks: Dict[str, List[Task]] = {}
+        self._completed_tasks: Dict[str, Set[str]] = {}
+        self._live_children: Dict[str, int] = {}
         #set json file
-        self.load_from_file()
-        self._build_indexes()
+        with self.lock:
+            self.load_from_file()
+            self._build_indexes()
+            if persist_history:
+                # Steps saved against another version of the data file no longer apply
+                self.history.load(self.history_path, self.file_version)
+            if self.data.settings.get("auto_archive"):
+                self.run_maintenance()
 
 
 #======= file operations ========
 
+    @metrics.timed("todo_operation_seconds", op="load")
     def load_from_file(self):
         """Load data from JSON file"""
+        self._new_revision()
         try:
             # Check if file exists
             if not self.file_path.exists():
@@ -34,46 +135,282 @@ class Todo:
                 self._create_default_file()
                 return True
             
+            # Files from older versions are upgraded on disk first
+            try:
+                migrate_file(self.file_path)
+            except UnsupportedVersionError:
+                # Loading (and later saving) it would drop whatever the newer version added
+                raise
+            except (OSError, ValueError) as e:
+                # The file is only replaced once a migration is complete, so it's still intact
+                print(f"Couldn't migrate {self.file_path}: {e}")
+            
             # Read file
-            with open(self.file_path, 'r', encoding='utf-8') as f:
-                data = json.load(f)
-                
-                # Check if JSON is empty or null
-                if not data:
-                    print("Data is empty, creating default data")
-                    self._create_default_file()
-                    return True
+            with metrics.timer("todo_stage_seconds", stage="read"):
+                text = read_text(self.file_path)
+                data = json.loads(text)
                 
-                self.data = TodoModel.model_validate(data)
-                print("Data loaded successfully")
+            # Check if JSON is empty or null
+            if not data:
+                print("Data is empty, creating default data")
+                self._create_default_file()
+                return True
+            
+            self.shards.clear()
+            self._unloaded.clear()
+            self._task_shards = None
+            self._removed_shards.clear()
+            # Unchanged since we saved it: skip validation
+            self.last_load_trusted = not self.always_validate and has_valid_checksum(text)
+            if data.get("format") == "sharded":
+                self.sharded = True
+                self.data = self._load_manifest(data)
+            elif self.last_load_trusted:
+                with metrics.timer("todo_stage_seconds", stage="construct"):
+                    self.data = self._construct_trusted(data)
+            else:
+                with metrics.timer("todo_stage_seconds", stage="validate"):
+                    self.data = self._validate(data)
+            # Switching a single-file store to shards: every section needs its file
+            self._dirty_sections = set()
+            if self.sharded and not self.shards:
+                self._dirty_sections = {section.name for section in self.data.sections}
+            self._remember_file_version()
+            print("Data loaded successfully")
             return True
             
+        except UnsupportedVersionError as e:
+            metrics.inc("todo_errors_total", op="load")
+            print(f"Can't open {self.file_path}: {e}")
+            raise
+            
         except json.JSONDecodeError as e:
+            metrics.inc("todo_errors_total", op="load")
             print(f"JSON format error: {e}")
             print("Creating new file with default data")
             self._create_default_file()
             return True
             
         except Exception as e:
+            metrics.inc("todo_errors_total", op="load")
             print(f"Error loading file: {e}")
             print("Creating new file with default data")
             self._create_default_file()
             return True
     
+    @metrics.timed("todo_operation_seconds", op="build_indexes")
     def _build_indexes(self):
         """Build indexes for fast lookup"""
         self.task_index.clear()
         self.section_index.clear()
+        self.parent_index.clear()
+        self.schedule_index.clear()
+        self.created_index.clear()
+        self.updated_index.clear()
+        self.deleted_index.clear()
+        self.tag_index.clear()
+        self.dependencies.clear()
+        self.recurrences.clear()
+        self._live_tasks.clear()
+        self._completed_tasks.clear()
+        self._live_children.clear()
         
-        for section_data in self.data.sections:
-            section = Section.model_validate(section_data.model_dump())
+        with self.schedule_index.bulk(), self.created_index.bulk(), \
+                self.updated_index.bulk(), self.deleted_index.bulk(), self.tag_index.bulk():
+            self._index_sections()
+    
+    def _index_sections(self):
+        """Index every section and task of the loaded data"""
+        for i, section_data in enumerate(self.data.sections):
+            section = section_data
+            if not isinstance(section, Section):
+                # Already validated, only the class changes
+                section = construct(Section, section_data.__dict__.copy(), section_data.model_fields_set)
+            # Keep the indexed objects and the stored objects the same
+            section.tasks = [self._as_task(task) for task in section.tasks]
+            self.data.sections[i] = section
             self.section_index[section.name] = section
             
             for task in section.tasks:
-                self.task_index[task.id] = Task.model_validate(task.model_dump())
-                # Index subtasks too
-                for subtask in task.subtasks:
-                    self.task_index[subtask.id] = Task.model_validate(subtask.model_dump())
+                self._index_task(task, section)
+            self._index_live_tasks(section)
+    
+    def _index_live_tasks(self, section: Section):
+        """Collect the live top-level tasks of a section that was just loaded or attached"""
+        live = [task for task in section.tasks if not task.deleted_at]
+        self._live_tasks[section.name] = live
+        self._completed_tasks[section.name] = {task.id for task in live if task.completed}
+    
+    def _live_position(self, section: Section, task: Task) -> int:
+        """Where a task goes in its section's live list: after the live tasks before it"""
+        position = 0
+        for item in section.tasks:
+            if item is task:
+                break
+            if not item.deleted_at:
+                position += 1
+        return position
+    
+    def _as_task(self, task_data) -> Task:
+        """Convert a loaded task (and its subtasks) into Task objects"""
+        task = task_data
+        if not isinstance(task, Task):
+            task = construct(Task, task_data.__dict__.copy(), task_data.model_fields_set)
+        task.subtasks = [self._as_task(subtask) for subtask in task.subtasks]
+        return task
+    
+    def _validate(self, data: Dict[str, Any]) -> TodoModel:
+        """Fully validate the store, straight into Section/Task objects"""
+        sections = data.pop("sections", [])
+        model = TodoModel.model_validate(data)
+        model.sections = [Section.model_validate(section) for section in sections]
+        return model
+    
+    def _construct_trusted(self, data: Dict[str, Any]) -> TodoModel:
+        """Build the store straight into Section/Task objects, without validation"""
+        data.pop("checksum", None)
+        sections = [Section.from_trusted(section) for section in data.pop("sections", ())]
+        return TodoModel.model_construct(sections=sections, **trusted_values(TodoModel, data))
+    
+    def _file_version(self) -> Tuple[int, int, int]:
+        # Saves replace the file, so the inode tells apart two writes within one mtime tick
+        stat = self.file_path.stat()
+        return stat.st_mtime_ns, stat.st_ino, stat.st_size
+    
+    def _remember_file_version(self):
+        self.file_version = self._file_version()
+    
+    def is_stale(self) -> bool:
+        """Check if the file was changed by someone else since we loaded or saved it"""
+        try:
+            return self._file_version() != self.file_version
+        except OSError:
+            return True
+    
+    @contextlib.contextmanager
+    def transaction(self):
+        """Hold the store lock for a block of operations, picking up changes saved by other processes first"""
+        with self.lock:
+            self._reload_if_stale()
+            yield self
+    
+    def close(self):
+        """Flush unsaved changes before the store is dropped"""
+        # Waits for an operation still running on the store
+        with self.lock:
+            if self.dirty:
+                self.save_to_file()
+            if self._history_claim is not None:
+                self._history_claim.close()
+                self._history_claim = None
+    
+    def _index_task(self, task: Task, parent: Union[Section, Task]):
+        """Add a task and its subtasks to the indexes"""
+        self.task_index[task.id] = task
+        self.parent_index[task.id] = parent
+        self.created_index.add(task.id, (task.created_at,))
+        if isinstance(parent, Task) and not task.deleted_at:
+            self._live_children[parent.id] = self._live_children.get(parent.id, 0) + 1
+        self._on_task_updated(task)
+        task._on_update = self._on_task_changed
+        task._on_subtask = self._on_subtask_changed
+        for subtask in task.subtasks:
+            self._index_task(subtask, task)
+    
+    def _unindex_task(self, task: Task):
+        """Remove a task and its subtasks from the indexes"""
+        self.task_index.pop(task.id, None)
+        parent = self.parent_index.pop(task.id, None)
+        if isinstance(parent, Task):
+            if not task.deleted_at and parent.id in self._live_children:
+                self._live_children[parent.id] -= 1
+        elif parent is not None and parent.name in self._completed_tasks:
+            self._completed_tasks[parent.name].discard(task.id)
+        self._live_children.pop(task.id, None)
+        self.schedule_index.remove(task.id)
+        self.created_index.remove(task.id)
+        self.updated_index.remove(task.id)
+        self.deleted_index.remove(task.id)
+        self.tag_index.remove(task.id)
+        self.dependencies.remove(task.id)
+        self.recurrences.remove(task.id)
+        task._on_update = None
+        task._on_subtask = None
+        for subtask in task.subtasks:
+            self._unindex_task(subtask)
+    
+    def _on_task_changed(self, task: Task):
+        """Called by a Task whenever it changes"""
+        self.dirty = True
+        self._mark_dirty(self._section_of(task))
+        # Trashed or restored (the deleted index still has the old state)
+        if bool(task.deleted_at) != (task.id in self.deleted_index):
+            self._on_live_changed(task, not task.deleted_at)
+        self._on_task_updated(task)
+    
+    def _on_live_changed(self, task: Task, live: bool):
+        """Keep the live lists and counts in step when a task is trashed or restored"""
+        parent = self.parent_index.get(task.id)
+        if isinstance(parent, Task):
+            self._live_children[parent.id] = self._live_children.get(parent.id, 0) + (1 if live else -1)
+        elif parent is not None and parent.name in self._live_tasks:
+            tasks = self._live_tasks[parent.name]
+            if live:
+                tasks.insert(self._live_position(parent, task), task)
+            else:
+                del tasks[next(i for i, item in enumerate(tasks) if item is task)]
+    
+    def _on_subtask_changed(self, parent: Task, subtask: Task, added: bool):
+        """Called by a Task when a subtask is added or removed directly on it"""
+        self.dirty = True
+        if added:
+            self._attach_task(subtask, parent)
+            self.history.record({"op": "remove_task", "id": subtask.id})
+        else:
+            self.history.record(self._remove_task(subtask))
+    
+    def _on_task_updated(self, task: Task):
+        """Reindex a task after it changed"""
+        self.updated_index.add(task.id, (task.updated_at,))
+        if task.deleted_at:
+            self.deleted_index.add(task.id, (task.deleted_at,))
+        else:
+            self.deleted_index.remove(task.id)
+        self._schedule_task(task)
+        self._index_live_state(task)
+        parent = self.parent_index.get(task.id)
+        if isinstance(parent, Section) and parent.name in self._completed_tasks:
+            if task.completed and not task.deleted_at:
+                self._completed_tasks[parent.name].add(task.id)
+            else:
+                self._completed_tasks[parent.name].discard(task.id)
+    
+    def _schedule_task(self, task: Task):
+        """Keep a task's position in the schedule index up to date"""
+        if task.due_at is None or task.completed or not self.is_live(task):
+            self.schedule_index.remove(task.id)
+            return
+        priority = math.inf if task.priority is None else task.priority
+        self.schedule_index.add(task.id, (task.due_at, priority))
+    
+    def _index_live_state(self, task: Task):
+        """Keep a task's tag bits, dependency state and next occurrence up to date"""
+        if self.is_live(task):
+            self.tag_index.update(task.id, task.tags, task.completed)
+            self.dependencies.update(task.id, task.blocked_by, not task.completed)
+        else:
+            # Trashed tasks drop out of tag queries, stop blocking others and stop recurring
+            self.tag_index.remove(task.id)
+            self.dependencies.update(task.id, task.blocked_by, False)
+        try:
+            if task.recurrence and task.due_at and self.is_live(task):
+                self.recurrences.update(task.id, next_occurrence(task.recurrence, task.due_at,
+                                                                  task.recurrence_anchor))
+                return
+        except (ValueError, OverflowError):
+            # A rule we can't read (e.g. edited by hand) or whose next date is out of range doesn't recur
+            pass
+        self.recurrences.remove(task.id)
     
     def _create_default_file(self):
         """Create file with default data"""
@@ -92,30 +429,229 @@ class Todo:
         except Exception as e:
             print(f"Error creating default file: {e}")
     
+    @metrics.timed("todo_operation_seconds", op="save")
     def save_to_file(self):
         """Save data to JSON file"""
         try:
             # Create directory if it doesn't exist
             self.file_path.parent.mkdir(parents=True, exist_ok=True)
             
-            with open(self.file_path, 'w', encoding='utf-8') as f:
-                json.dump(self.data.model_dump(), f, ensure_ascii=False, indent=4, default=str)
-            self.reload()  # Rebuild indexes after save
+            if self.sharded:
+                self._save_shards()
+            else:
+                with metrics.timer("todo_stage_seconds", stage="serialize"):
+                    text = dumps_checksummed(self.data.model_dump())
+                with metrics.timer("todo_stage_seconds", stage="write"):
+                    write_text(self.file_path, text)
+            self._remember_file_version()
+            self.dirty = False
+            if self.persist_history:
+                self.history.save(self.history_path, self.file_version)
             self._update_timestamp()
             return True
         except Exception as e:
+            metrics.inc("todo_errors_total", op="save")
             print(f"Error saving file: {e}")
             return False
     
+# ======= sharded storage ========
+
+    def _load_manifest(self, data: Dict[str, Any]) -> TodoModel:
+        """Read the manifest only; sections stay empty until first access"""
+        entries = data.get("sections", [])
+        model = TodoModel.model_validate({key: value for key, value in data.items()
+                                          if key not in ("sections", "format", "checksum")})
+        for entry in entries:
+            model.sections.append(Section(name=entry["name"], created_at=entry["created_at"],
+                                          updated_at=entry["updated_at"]))
+            self.shards[entry["name"]] = entry
+            self._unloaded.add(entry["name"])
+        return model
+    
+    @metrics.timed("todo_operation_seconds", op="load_shard")
+    def _load_shard(self, name: str):
+        """Read one section file and index its tasks"""
+        self._unloaded.discard(name)
+        section = self.section_index[name]
+        path = self.shard_dir / self.shards[name]["file"]
+        try:
+            text = read_text(path)
+            data = json.loads(text)
+            if not self.always_validate and has_valid_checksum(text):
+                loaded = Section.from_trusted(data)
+            else:
+                loaded = Section.model_validate(data)
+        except (OSError, ValueError) as e:
+            print(f"Error loading section '{name}': {e}")
+            return
+        section.tasks = [self._as_task(task) for task in loaded.tasks]
+        # Fills in the ids for manifests written before they were kept
+        self.shards[name]["task_ids"] = self._task_ids(section)
+        with self.schedule_index.bulk(), self.created_index.bulk(), \
+                self.updated_index.bulk(), self.deleted_index.bulk():
+            for task in section.tasks:
+                self._index_task(task, section)
+        self._index_live_tasks(section)
+    
+    def load_all_shards(self):
+        """Load every section that hasn't been loaded yet"""
+        for name in list(self._unloaded):
+            self._load_shard(name)
+    
+    def _load_shard_of(self, task_id: str):
+        """Load the section holding a task, looked up in the manifest's task ids"""
+        if self._task_shards is None:
+            if any("task_ids" not in self.shards[name] for name in self._unloaded):
+                # Older manifest: the task could be anywhere
+                self.load_all_shards()
+                return
+            self._task_shards = {}
+            for name in self._unloaded:
+                for item_id in self.shards[name]["task_ids"]:
+                    self._task_shards[item_id] = name
+        name = self._task_shards.get(task_id)
+        if name in self._unloaded:
+            self._load_shard(name)
+    
+    def _task_ids(self, section: Section) -> List[str]:
+        """Ids of every task and subtask in a section"""
+        ids = []
+        pending = list(section.tasks)
+        while pending:
+            task = pending.pop()
+            ids.append(task.id)
+            pending.extend(task.subtasks)
+        return ids
+    
+    def _save_shards(self):
+        """Write dirty section files, drop removed ones, then rewrite the manifest"""
+        for file_name in self._removed_shards:
+            (self.shard_dir / file_name).unlink(missing_ok=True)
+        self._removed_shards.clear()
+        
+        for name in self._dirty_sections:
+            section = self.section_index.get(name)
+            if section is None or name in self._unloaded:
+                continue
+            entry = self.shards.setdefault(name, {"file": shard_file_name(name), "revision": 0})
+            with metrics.timer("todo_stage_seconds", stage="serialize"):
+                text = dumps_checksummed(section.model_dump())
+            with metrics.timer("todo_stage_seconds", stage="write"):
+                write_text(self.shard_dir / entry["file"], text)
+            tasks, completed = self._section_view(name)
+            entry.update({
+                "name": name,
+                "count": len(tasks),
+                "completed": completed,
+                "task_ids": self._task_ids(section),
+                "revision": entry["revision"] + 1,
+                "created_at": section.created_at,
+                "updated_at": section.updated_at,
+            })
+        self._dirty_sections.clear()
+        
+        manifest = self.data.model_dump(exclude={"sections"})
+        manifest["format"] = "sharded"
+        manifest["sections"] = [self.shards[section.name] for section in self.data.sections]
+        write_text(self.file_path, dumps_checksummed(manifest))
+    
+    def _mark_dirty(self, section: Optional[Section]):
+        """Record a change: new store revision, section needs saving"""
+        self.revision = next(_revisions)
+        if section is not None:
+            self._dirty_sections.add(section.name)
+            self.section_revisions[section.name] = self.revision
+    
+    def _new_revision(self):
+        """Everything may have changed (load, reset): give every section a new revision"""
+        self.revision = self.load_revision = next(_revisions)
+        self.section_revisions.clear()
+    
+    def section_revision(self, name: str) -> int:
+        """Revision of a section's last change"""
+        return self.section_revisions.get(name, self.load_revision)
+    
+    def _section_of(self, task: Union[Section, Task]) -> Optional[Section]:
+        """Find the section a task (or subtask) lives in"""
+        while isinstance(task, Task):
+            task = self.parent_index.get(task.id)
+        return task
+    
+    def _section_view(self, name: str) -> Tuple[List[Task], int]:
+        """Live top-level tasks of a loaded section and how many are completed"""
+        return self._live_tasks[name], len(self._completed_tasks[name])
+    
+    def live_child_count(self, task_id: str) -> int:
+        """Number of subtasks (not in the trash) of a task"""
+        return self._live_children.get(task_id, 0)
+    
+    def section_task_count(self, name: str) -> int:
+        """Number of tasks (not in the trash) in a section, from the manifest if it isn't loaded"""
+        if name in self._unloaded:
+            return self.shards[name].get("count", 0)
+        if name not in self.section_index:
+            return 0
+        return len(self._section_view(name)[0])
+    
+    def section_summaries(self) -> List[Dict[str, Any]]:
+        """Name, task counts and dates of every section, without loading section files"""
+        summaries = []
+        for section in self.data.sections:
+            if section.name in self._unloaded:
+                entry = self.shards[section.name]
+                count, completed = entry.get("count", 0), entry.get("completed", 0)
+            else:
+                tasks, completed = self._section_view(section.name)
+                count = len(tasks)
+            summaries.append({
+                "name": section.name,
+                "task_count": count,
+                "completed_count": completed,
+                "created_at": section.created_at,
+                "updated_at": section.updated_at,
+            })
+        return summaries
+    
+    def get_section_page(self, name: str, offset: int = 0, limit: int = 50) -> Optional[Tuple[int, List[Task]]]:
+        """Live top-level tasks [offset, offset + limit) of a section and their total (None if no section)"""
+        if self.get_section_by_name(name) is None:
+            return None
+        tasks, _ = self._section_view(name)
+        return len(tasks), tasks[offset:offset + limit]
+    
+    def get_subtask_page(self, task_id: str, offset: int = 0, limit: int = 50) -> Optional[Tuple[int, List[Task]]]:
+        """Live subtasks [offset, offset + limit) of a task and their total (None if no task)"""
+        # The task's section is loaded when the tree got down to it, don't load all of them
+        task = self.task_index.get(task_id) or self.get_task(task_id)
+        if task is None:
+            return None
+        total = self._live_children.get(task.id, 0)
+        if total == len(task.subtasks):
+            # Nothing trashed, no need to filter
+            return total, task.subtasks[offset:offset + limit]
+        subtasks = [subtask for subtask in task.subtasks if not subtask.deleted_at]
+        return total, subtasks[offset:offset + limit]
+    
 # ======= data manipulation methods ========
 
-    def create_task(self, title: str, section_name: str, description: str = "") -> Task:
+    def create_task(self, title: str, section_name: str, description: str = "",
+                    due_at: Optional[datetime] = None, priority: Optional[int] = None,
+                    tags: Optional[List[str]] = None) -> Task:
         """Create a new task"""
         
-        task = Task(title=title, description=description)
+        task = Task(title=title, description=description, due_at=due_at, priority=priority,
+                    tags=tags or [])
         self.add_task_to_section(task, section_name)
         return task
     
+    def create_subtask(self, parent_id: str, title: str, description: str = "",
+                       due_at: Optional[datetime] = None, priority: Optional[int] = None,
+                       tags: Optional[List[str]] = None) -> Optional[Task]:
+        """Create a new subtask under an existing task"""
+        subtask = Task(title=title, description=description, due_at=due_at, priority=priority,
+                       tags=tags or [])
+        return subtask if self.add_subtask(parent_id, subtask) else None
+    
     def create_section(self, name: str) -> Section:
         """Create a new section (if it doesn't exist)"""
         if name in self.section_index:
@@ -126,6 +662,7 @@ class Todo:
         self.add_section(section)
         return section
     
+    @metrics.timed("todo_operation_seconds", op="add_task")
     def add_task_to_section(self, task: Task, section_name: str):
         """Add task to a specific section"""
         section = self.get_section_by_name(section_name) or self.create_section(section_name)
@@ -134,17 +671,34 @@ class Todo:
             print(f"Section '{section_name}' not found and couldn't be created")
             return False
         
-        section.add_task(task)
+        self._attach_task(task, section)
+        self.history.record({"op": "remove_task", "id": task.id})
         
-        self.add_section(section)
         self.save_to_file()
         return True
     
+    @metrics.timed("todo_operation_seconds", op="add_subtask")
+    @needs_task_shard
+    def add_subtask(self, parent_id: str, subtask: Task) -> bool:
+        """Add a subtask to an existing task"""
+        parent = self.task_index.get(parent_id)
+        if not parent:
+            print(f"Task with ID {parent_id} not found")
+            return False
+        # Indexed and recorded for undo through the parent's hook
+        parent.add_subtask(subtask)
+        self.save_to_file()
+        return True
+    
+    @metrics.timed("todo_operation_seconds", op="add_section")
     def add_section(self, section: Section):
         """Add a new section"""
-        self.data.sections.append(section)
+        self._attach_section(section)
+        self.history.record({"op": "remove_section", "name": section.name})
         self.save_to_file()
     
+    @metrics.timed("todo_operation_seconds", op="remove_task")
+    @needs_task_shard
     def remove_task_by_id(self, task_id: str) -> bool:
         """Remove task by ID"""
         # 1. Get task from index
@@ -152,57 +706,675 @@ class Todo:
         if not task:
             print(f"Task with ID {task_id} not found")
             return False
-        for section in self.section_index.values():
-            if task in section.tasks:
-                section.remove_task(task)
-                break
+        # 2. Detach it from whatever holds it
+        self.history.record(self._remove_task(task))
         self.save_to_file()
         print(f"Removed task: {task.title}")
         return True
     
+    @metrics.timed("todo_operation_seconds", op="remove_section")
     def remove_section_by_name(self, section_name: str) -> bool:
         """Remove section by name"""
         # 1. Check if section exists
-        section = self.section_index.get(section_name)
+        section = self.get_section_by_name(section_name)
         if not section:
             print(f"Section '{section_name}' not found")
             return False
         # 2. Remove section from data
-        self.data.sections.remove(section)
+        self.history.record(self._remove_section(section))
         self.save_to_file()
         print(f"Removed section: {section_name}")
         return True
     
+    @metrics.timed("todo_operation_seconds", op="complete_task")
+    @needs_task_shard
+    def complete_task(self, task_id: str) -> Optional[Task]:
+        """Mark a task as complete"""
+        task = self.task_index.get(task_id)
+        if not task:
+            print(f"Task with ID {task_id} not found")
+            return None
+        undo_ops = [self._fields_op(task, ["completed"])]
+        task.complete()
+        if task.id in self.recurrences:
+            # Completing an occurrence brings up the next one right away
+            self._repeat_task(task, datetime.now(), undo_ops)
+        self.history.record(undo_ops[0] if len(undo_ops) == 1 else {"op": "batch", "ops": undo_ops})
+        self.save_to_file()
+        return task
+    
+    @metrics.timed("todo_operation_seconds", op="incomplete_task")
+    @needs_task_shard
+    def incomplete_task(self, task_id: str) -> Optional[Task]:
+        """Mark a task as incomplete"""
+        task = self.task_index.get(task_id)
+        if not task:
+            print(f"Task with ID {task_id} not found")
+            return None
+        self._record_fields(task, ["completed"])
+        task.incomplete()
+        self.save_to_file()
+        return task
+    
+    @metrics.timed("todo_operation_seconds", op="update_task")
+    @needs_task_shard
+    def update_task(self, task_id: str, **changes) -> Optional[Task]:
+        """Edit a task's title, description, due date, priority or tags"""
+        task = self.task_index.get(task_id)
+        if not task:
+            print(f"Task with ID {task_id} not found")
+            return None
+        # A new due date also moves a recurring task's anchor
+        self._record_fields(task, list(changes) + (["recurrence_anchor"] if "due_at" in changes else []))
+        if "title" in changes:
+            task.update_title(changes["title"])
+        if "description" in changes:
+            task.update_description(changes["description"])
+        if "due_at" in changes:
+            task.set_due(changes["due_at"])
+        if "priority" in changes:
+            task.set_priority(changes["priority"])
+        if "tags" in changes:
+            task.set_tags(changes["tags"])
+        self.save_to_file()
+        return task
+    
+    @metrics.timed("todo_operation_seconds", op="tag_task")
+    @needs_task_shard
+    def tag_task(self, task_id: str, add: Iterable[str] = (), remove: Iterable[str] = ()) -> Optional[Task]:
+        """Add and/or remove tags of a task"""
+        task = self.task_index.get(task_id)
+        if not task:
+            print(f"Task with ID {task_id} not found")
+            return None
+        self._record_fields(task, ["tags"])
+        for tag in remove:
+            task.remove_tag(tag)
+        for tag in add:
+            task.add_tag(tag)
+        self.save_to_file()
+        return task
+    
+    @metrics.timed("todo_operation_seconds", op="add_dependency")
+    @needs_all_shards
+    def add_dependency(self, task_id: str, blocker_id: str) -> Optional[Task]:
+        """Make a task wait for another one (raises ValueError if that would close a cycle)"""
+        task = self.task_index.get(task_id)
+        blocker = self.task_index.get(blocker_id)
+        if not task or not blocker:
+            print(f"Task with ID {task_id if not task else blocker_id} not found")
+            return None
+        if self.dependencies.would_cycle(task_id, blocker_id):
+            raise ValueError(f"Task {task_id} blocked by {blocker_id} would create a dependency cycle")
+        self._record_fields(task, ["blocked_by"])
+        task.add_blocker(blocker_id)
+        self.save_to_file()
+        return task
+    
+    @metrics.timed("todo_operation_seconds", op="remove_dependency")
+    @needs_task_shard
+    def remove_dependency(self, task_id: str, blocker_id: str) -> Optional[Task]:
+        """Stop a task waiting for another one"""
+        task = self.task_index.get(task_id)
+        if not task or blocker_id not in task.blocked_by:
+            print(f"Task with ID {task_id} isn't blocked by {blocker_id}")
+            return None
+        self._record_fields(task, ["blocked_by"])
+        task.remove_blocker(blocker_id)
+        self.save_to_file()
+        return task
+    
+    @metrics.timed("todo_operation_seconds", op="set_recurrence")
+    @needs_task_shard
+    def set_recurrence(self, task_id: str, rule: Optional[str]) -> Optional[Task]:
+        """Make a task repeat ("daily", "weekly", "every 2 weeks", ...) or stop repeating (None)
+
+        Raises ValueError for an unknown rule or a task without a due date.
+        """
+        task = self.task_index.get(task_id)
+        if not task:
+            print(f"Task with ID {task_id} not found")
+            return None
+        if rule is not None:
+            parse_rule(rule)
+            if task.due_at is None:
+                raise ValueError("A recurring task needs a due date")
+        self._record_fields(task, ["recurrence", "recurrence_anchor"])
+        task.set_recurrence(rule)
+        self.save_to_file()
+        return task
+    
+    @metrics.timed("todo_operation_seconds", op="materialize_recurrences")
+    @needs_all_shards
+    def materialize_recurrences(self, now: Optional[datetime] = None) -> List[Task]:
+        """Create every occurrence of recurring tasks due by now, with one save and one undo step
+
+        Raises ValueError if now is more than UPCOMING_HORIZON ahead of the real time.
+        """
+        if now is not None and now > datetime.now() + UPCOMING_HORIZON:
+            raise ValueError(f"Can't create occurrences more than {UPCOMING_HORIZON.days} days ahead")
+        now = now or datetime.now()
+        next_at = self.recurrences.peek()
+        if next_at is None or next_at > now:
+            return []
+        undo_ops: List[Operation] = []
+        created = [self._repeat_task(self.task_index[task_id], now, undo_ops)
+                   for task_id, _ in self.recurrences.pop_due(now)]
+        if created:
+            self.history.record({"op": "batch", "ops": undo_ops})
+            self.save_to_file()
+            print(f"Created {len(created)} recurring tasks")
+        return created
+    
+    def _repeat_task(self, task: Task, now: datetime, undo_ops: List[Operation]) -> Task:
+        """Add the next occurrence of a recurring task to its container and hand over the rule"""
+        # Occurrences missed in the meantime are skipped, only the latest one is created
+        due_at = catch_up(task.recurrence, task.due_at, now, task.recurrence_anchor)
+        occurrence = task.repeated(due_at - task.due_at)
+        undo_ops.append(self._fields_op(task, ["recurrence", "recurrence_anchor"]))
+        task.set_recurrence(None)
+        self._attach_task(occurrence, self.parent_index[task.id])
+        undo_ops.append({"op": "remove_task", "id": occurrence.id})
+        return occurrence
+    
+    @needs_all_shards
+    def upcoming_occurrences(self, end: datetime, limit: int = UPCOMING_LIMIT) -> List[Tuple[datetime, Task]]:
+        """Get (due date, task) of future occurrences of recurring tasks before end, without creating them
+
+        Raises ValueError if end is more than UPCOMING_HORIZON ahead or there are more than limit occurrences.
+        """
+        if end > datetime.now() + UPCOMING_HORIZON:
+            raise ValueError(f"Can't look more than {UPCOMING_HORIZON.days} days ahead")
+        upcoming = []
+        for at, task_id in self.recurrences.until(end):
+            task = self.task_index[task_id]
+            while at < end:
+                if len(upcoming) >= limit:
+                    raise ValueError(f"More than {limit} occurrences before {end:%Y-%m-%d}, pick an earlier date")
+                upcoming.append((at, task))
+                try:
+                    at = next_occurrence(task.recurrence, at, task.recurrence_anchor)
+                except (ValueError, OverflowError):
+                    # The next one is past the largest date we can hold
+                    break
+        return sorted(upcoming, key=lambda item: item[0])
+    
+    @metrics.timed("todo_operation_seconds", op="soft_delete_task")
+    @needs_task_shard
+    def soft_delete_task(self, task_id: str) -> Optional[Task]:
+        """Move a task to the trash (kept as a tombstone until compaction)"""
+        task = self.task_index.get(task_id)
+        if not task or task.deleted_at:
+            print(f"Task with ID {task_id} not found")
+            return None
+        task.soft_delete()
+        self._reschedule_subtasks(task)
+        self.history.record({"op": "restore_deleted", "id": task.id})
+        self.save_to_file()
+        print(f"Moved task to trash: {task.title}")
+        return task
+    
+    @metrics.timed("todo_operation_seconds", op="restore_deleted_task")
+    @needs_task_shard
+    def restore_deleted_task(self, task_id: str) -> Optional[Task]:
+        """Take a task back out of the trash"""
+        task = self.task_index.get(task_id)
+        if not task or not task.deleted_at:
+            print(f"Deleted task with ID {task_id} not found")
+            return None
+        task.restore()
+        self._reschedule_subtasks(task)
+        self.history.record({"op": "soft_delete", "id": task.id})
+        self.save_to_file()
+        return task
+    
+    @needs_all_shards
+    def get_deleted_tasks(self) -> List[Task]:
+        """Get tasks in the trash, oldest deletion first"""
+        return [self.task_index[task_id] for task_id in self.deleted_index.between()]
+    
+    def is_live(self, task: Task) -> bool:
+        """Check that neither the task nor any parent task is soft-deleted"""
+        while isinstance(task, Task):
+            if task.deleted_at:
+                return False
+            task = self.parent_index.get(task.id)
+        return True
+    
+    def _reschedule_subtasks(self, task: Task):
+        """Subtasks of a trashed task leave (or rejoin) the schedule and other indexes with it"""
+        for subtask in task.subtasks:
+            self._schedule_task(subtask)
+            self._index_live_state(subtask)
+            self._reschedule_subtasks(subtask)
+    
+# ======= archive and compaction ========
+
+    @metrics.timed("todo_operation_seconds", op="archive_completed")
+    @needs_all_shards
+    def archive_completed(self, older_than: Optional[timedelta] = None) -> int:
+        """Move completed tasks untouched for a while to the archive file"""
+        if older_than is None:
+            older_than = timedelta(days=self.data.settings.get("archive_after_days", 30))
+        cutoff = datetime.now() - older_than
+        
+        entries = []
+        for task_id in self.updated_index.between(end=(cutoff,)):
+            task = self.task_index.get(task_id)
+            parent = self.parent_index.get(task_id)
+            # Only whole top-level tasks are archived; subtasks travel with their parent
+            if not task or not isinstance(parent, Section):
+                continue
+            if task.deleted_at or not task.is_fully_complete():
+                continue
+            restore_op = self._remove_task(task)
+            entries.append({
+                "section": parent.name,
+                "archived_at": datetime.now().isoformat(),
+                "task": restore_op["task"],
+            })
+        
+        if entries:
+            self._append_archive(entries)
+            self.save_to_file()
+            print(f"Archived {len(entries)} completed tasks")
+        return len(entries)
+    
+    @metrics.timed("todo_operation_seconds", op="compact")
+    @needs_all_shards
+    def compact(self, older_than: timedelta = timedelta(0)) -> int:
+        """Permanently purge tasks that have been in the trash for a while"""
+        cutoff = datetime.now() - older_than
+        purged = 0
+        for task_id in self.deleted_index.between(end=(cutoff,)):
+            task = self.task_index.get(task_id)
+            # Already gone with a purged parent
+            if task:
+                self._remove_task(task)
+                purged += 1
+        if purged:
+            self.save_to_file()
+            print(f"Purged {purged} deleted tasks")
+        return purged
+    
+    def run_maintenance(self):
+        """Create due recurring tasks, archive old completed ones and purge old tombstones"""
+        self.materialize_recurrences()
+        self.archive_completed()
+        self.compact(timedelta(days=self.data.settings.get("purge_deleted_after_days", 7)))
+    
+    def get_archived_tasks(self) -> List[Task]:
+        """Get archived tasks (loads the archive file on first call)"""
+        return [entry["task"] for entry in self._load_archive().values()]
+    
+    def get_archived_task(self, task_id: str) -> Optional[Task]:
+        """Get an archived task by ID"""
+        entry = self._load_archive().get(task_id)
+        return entry["task"] if entry else None
+    
+    def unarchive_task(self, task_id: str) -> Optional[Task]:
+        """Move a task from the archive back into its section"""
+        archive = self._load_archive()
+        entry = archive.pop(task_id, None)
+        if not entry:
+            print(f"Archived task with ID {task_id} not found")
+            return None
+        self._write_archive()
+        
+        task = self._as_task(entry["task"])
+        section = self.get_section_by_name(entry["section"])
+        if not section:
+            section = Section(name=entry["section"])
+            self._attach_section(section)
+        self._attach_task(task, section)
+        self.save_to_file()
+        return task
+    
+    def _load_archive(self) -> Dict[str, Dict[str, Any]]:
+        """Read the archive file once and keep it in memory"""
+        if self._archive is None:
+            self._archive = {}
+            if self.archive_path.exists():
+                with open(self.archive_path, 'r', encoding='utf-8') as f:
+                    for line in f:
+                        if line.strip():
+                            self._add_archive_entry(json.loads(line))
+        return self._archive
+    
+    def _add_archive_entry(self, entry: Dict[str, Any]):
+        entry = {**entry, "task": self._as_task(Task.model_validate(entry["task"]))}
+        self._archive[entry["task"].id] = entry
+    
+    def _append_archive(self, entries: List[Dict[str, Any]]):
+        """Append entries without reading the existing archive"""
+        self.archive_path.parent.mkdir(parents=True, exist_ok=True)
+        with open(self.archive_path, 'a', encoding='utf-8') as f:
+            for entry in entries:
+                f.write(json.dumps(entry, ensure_ascii=False, default=str) + "\n")
+        if self._archive is not None:
+            for entry in entries:
+                self._add_archive_entry(entry)
+    
+    def _write_archive(self):
+        """Rewrite the whole archive file from memory"""
+        lines = []
+        for entry in self._archive.values():
+            line = {**entry, "task": entry["task"].model_dump(mode="json")}
+            lines.append(json.dumps(line, ensure_ascii=False, default=str) + "\n")
+        # Atomic, so a crash mid-rewrite can't lose archived tasks
+        write_text(self.archive_path, "".join(lines))
+    
+# ======= undo / redo ========
+
+    @metrics.timed("todo_operation_seconds", op="undo")
+    @needs_all_shards
+    def undo(self) -> bool:
+        """Revert the last change"""
+        self._reload_if_stale()
+        op = self.history.pop_undo()
+        if op is None:
+            print("Nothing to undo")
+            return False
+        inverse = self._apply_operation(op)
+        if inverse is None:
+            return False
+        self.history.push_redo(inverse)
+        self.save_to_file()
+        return True
+    
+    @metrics.timed("todo_operation_seconds", op="redo")
+    @needs_all_shards
+    def redo(self) -> bool:
+        """Re-apply the last undone change"""
+        self._reload_if_stale()
+        op = self.history.pop_redo()
+        if op is None:
+            print("Nothing to redo")
+            return False
+        inverse = self._apply_operation(op)
+        if inverse is None:
+            return False
+        self.history.push_undo(inverse)
+        self.save_to_file()
+        return True
+    
+    def _reload_if_stale(self):
+        """Pick up another process's save (dropping history that no longer applies) before undo/redo"""
+        if not self.dirty and self.is_stale():
+            self.reload()
+    
+    def _fields_op(self, task: Task, fields: List[str]) -> Operation:
+        """An operation setting some task fields back to their current values"""
+        return {
+            "op": "set_fields",
+            "id": task.id,
+            "fields": task.model_dump(mode="json", include=set(fields)),
+        }
+    
+    def _record_fields(self, task: Task, fields: List[str]):
+        """Record the current values of some task fields as an undo step"""
+        self.history.record(self._fields_op(task, fields))
+    
+    def _apply_operation(self, op: Operation) -> Optional[Operation]:
+        """Apply a history operation and return its inverse"""
+        kind = op.get("op")
+        
+        if kind == "remove_task":
+            task = self.task_index.get(op["id"])
+            if task:
+                return self._remove_task(task)
+        
+        elif kind == "restore_task":
+            if op["section"]:
+                parent = self.section_index.get(op["parent"])
+                if not parent:
+                    parent = Section(name=op["parent"])
+                    self._attach_section(parent)
+            else:
+                parent = self.task_index.get(op["parent"])
+            if parent:
+                task = self._as_task(Task.model_validate(op["task"]))
+                self._attach_task(task, parent, op["index"])
+                return {"op": "remove_task", "id": task.id}
+        
+        elif kind == "remove_section":
+            section = self.get_section_by_name(op["name"])
+            if section:
+                return self._remove_section(section)
+        
+        elif kind == "restore_section":
+            section = Section.model_validate(op["section"])
+            section.tasks = [self._as_task(task) for task in section.tasks]
+            self._attach_section(section, op["index"])
+            return {"op": "remove_section", "name": section.name}
+        
+        elif kind in ("soft_delete", "restore_deleted"):
+            task = self.task_index.get(op["id"])
+            if task:
+                if kind == "soft_delete":
+                    task.soft_delete()
+                else:
+                    task.restore()
+                self._reschedule_subtasks(task)
+                return {"op": "restore_deleted" if kind == "soft_delete" else "soft_delete", "id": task.id}
+        
+        elif kind == "batch":
+            # Several changes undone as one step, last change first
+            inverses = [self._apply_operation(sub) for sub in reversed(op["ops"])]
+            return {"op": "batch", "ops": [inverse for inverse in inverses if inverse]}
+        
+        elif kind == "set_fields":
+            task = self.task_index.get(op["id"])
+            if task:
+                inverse = {
+                    "op": "set_fields",
+                    "id": task.id,
+                    "fields": task.model_dump(mode="json", include=set(op["fields"])),
+                }
+                # Validate the stored values back into their field types
+                values = Task.model_validate({"title": task.title, **op["fields"]})
+                for field in op["fields"]:
+                    setattr(task, field, getattr(values, field))
+                task.update_timestamp()
+                return inverse
+        
+        print(f"Can't apply history operation: {op}")
+        return None
+    
+# ======= structural changes (keep data and indexes in sync) ========
+
+    def _attach_task(self, task: Task, parent: Union[Section, Task], index: Optional[int] = None):
+        """Insert a task into a section or parent task and index it"""
+        container = parent.tasks if isinstance(parent, Section) else parent.subtasks
+        try:
+            self._index_task(task, parent)
+        except Exception:
+            # Don't leave a task half indexed; it isn't in the container yet
+            self._unindex_task(task)
+            raise
+        container.insert(len(container) if index is None else index, task)
+        if isinstance(parent, Section) and not task.deleted_at and parent.name in self._live_tasks:
+            live = self._live_tasks[parent.name]
+            if index is None:
+                live.append(task)
+            else:
+                live.insert(self._live_position(parent, task), task)
+        self._mark_dirty(self._section_of(parent))
+        if isinstance(parent, Task):
+            parent.update_timestamp()
+    
+    def _remove_task(self, task: Task) -> Operation:
+        """Detach a task from its container and return the operation restoring it"""
+        parent = self.parent_index[task.id]
+        in_section = isinstance(parent, Section)
+        self._mark_dirty(self._section_of(parent))
+        container = parent.tasks if in_section else parent.subtasks
+        # By identity: list.index would compare whole models field by field
+        index = next(i for i, item in enumerate(container) if item is task)
+        del container[index]
+        if in_section and not task.deleted_at and parent.name in self._live_tasks:
+            live = self._live_tasks[parent.name]
+            del live[next(i for i, item in enumerate(live) if item is task)]
+        self._unindex_task(task)
+        if not in_section:
+            parent.update_timestamp()
+        return {
+            "op": "restore_task",
+            "parent": parent.name if in_section else parent.id,
+            "section": in_section,
+            "index": index,
+            "task": task.model_dump(mode="json"),
+        }
+    
+    def _attach_section(self, section: Section, index: Optional[int] = None):
+        """Insert a section and index its tasks"""
+        sections = self.data.sections
+        sections.insert(len(sections) if index is None else index, section)
+        self.section_index[section.name] = section
+        self._mark_dirty(section)
+        for task in section.tasks:
+            self._index_task(task, section)
+        self._index_live_tasks(section)
+    
+    def _remove_section(self, section: Section) -> Operation:
+        """Detach a section and return the operation restoring it"""
+        index = self.data.sections.index(section)
+        del self.data.sections[index]
+        del self.section_index[section.name]
+        self._mark_dirty(section)
+        self._dirty_sections.discard(section.name)
+        entry = self.shards.pop(section.name, None)
+        if entry:
+            self._removed_shards.add(entry["file"])
+        for task in section.tasks:
+            self._unindex_task(task)
+        self._live_tasks.pop(section.name, None)
+        self._completed_tasks.pop(section.name, None)
+        return {"op": "restore_section", "index": index, "section": section.model_dump(mode="json")}
+    
+# ======= queries ========
+
+    @needs_task_shard
     def get_task(self, task_id: str) -> Optional[Task]:
         """Get task by ID"""
         return self.task_index.get(task_id)
     
+    def task_revision(self, task_id: str) -> Optional[int]:
+        """Revision of the section holding a task (None if there is no such task)"""
+        task = self.get_task(task_id)
+        section = self._section_of(task) if task else None
+        return self.section_revision(section.name) if section else None
+    
     def get_section_by_name(self, name: str) -> Optional[Section]:
-        """Get section by name"""
+        """Get section by name (loads its shard on first access)"""
+        if name in self._unloaded:
+            self._load_shard(name)
         return self.section_index.get(name)
     
+    @needs_all_shards
     def get_all_tasks(self) -> List[Task]:
-        """Get all tasks"""
-        return list(self.task_index.values())
+        """Get all tasks (not in the trash)"""
+        return [task for task in self.task_index.values() if self.is_live(task)]
     
     def get_all_sections(self) -> List[Section]:
         """Get all sections"""
         return list(self.section_index.values())
     
+    @needs_all_shards
     def get_completed_tasks(self) -> List[Task]:
         """Get all completed tasks"""
-        return [task for task in self.task_index.values() if task.completed]
+        return [task for task in self.task_index.values() if task.completed and self.is_live(task)]
+    
+    @needs_all_shards
+    def next_due(self, n: int = 10) -> List[Task]:
+        """Get the next n pending tasks by due date, then priority"""
+        self.materialize_recurrences()
+        return [self.task_index[task_id] for task_id in self.schedule_index.head(n)]
+    
+    @needs_all_shards
+    def overdue(self, now: Optional[datetime] = None) -> List[Task]:
+        """Get pending tasks that were due before now"""
+        # Occurrences are only created up to the real time, `now` just filters
+        self.materialize_recurrences()
+        now = now or datetime.now()
+        return [self.task_index[task_id] for task_id in self.schedule_index.between(end=(now,))]
+    
+    @needs_all_shards
+    def due_between(self, start: datetime, end: datetime) -> List[Task]:
+        """Get pending tasks due in [start, end)"""
+        self.materialize_recurrences()
+        return [self.task_index[task_id] for task_id in self.schedule_index.between((start,), (end,))]
+    
+    @needs_all_shards
+    def tasks_updated_since(self, since: datetime) -> List[Task]:
+        """Get tasks changed at or after a time, oldest change first"""
+        return [self.task_index[task_id] for task_id in self.updated_index.between((since,))]
+    
+    @needs_all_shards
+    def tasks_created_between(self, start: datetime, end: datetime) -> List[Task]:
+        """Get tasks created in [start, end)"""
+        return [self.task_index[task_id] for task_id in self.created_index.between((start,), (end,))]
+    
+    @needs_all_shards
+    def recent_activity(self, n: int = 10) -> List[Task]:
+        """Get the n most recently changed tasks, newest first"""
+        return [self.task_index[task_id] for task_id in self.updated_index.tail(n)]
+    
+    @needs_all_shards
+    def get_ready_tasks(self) -> List[Task]:
+        """Get pending tasks whose blockers are all complete, by priority then age"""
+        tasks = [self.task_index[task_id] for task_id in self.dependencies.ready]
+        return sorted(tasks, key=lambda task: (math.inf if task.priority is None else task.priority,
+                                               task.created_at))
+    
+    @needs_all_shards
+    def get_blockers(self, task_id: str) -> List[Task]:
+        """Get the pending tasks a task is waiting for"""
+        return [self.task_index[blocker_id] for blocker_id in self.dependencies.blockers(task_id)]
+    
+    @needs_all_shards
+    def topological_order(self) -> List[Task]:
+        """Get live tasks ordered so every task comes after its blockers"""
+        return [self.task_index[task_id] for task_id in self.dependencies.topological_order()
+                if self.is_live(self.task_index[task_id])]
+    
+    @needs_all_shards
+    def critical_path(self) -> List[Task]:
+        """Get the longest chain of pending tasks that have to be done one after another"""
+        return [self.task_index[task_id] for task_id in self.dependencies.critical_path()]
+    
+    @metrics.timed("todo_operation_seconds", op="find_tasks")
+    @needs_all_shards
+    def find_tasks(self, query: str) -> List[Task]:
+        """Get live tasks matching a tag query, e.g. "tag:urgent AND tag:backend NOT completed"
+
+        Raises ValueError if the query is malformed.
+        """
+        return [self.task_index[task_id] for task_id in self.tag_index.ids(self.tag_index.query(query))]
+    
+    @needs_all_shards
+    def tag_counts(self, query: Optional[str] = None) -> Dict[str, int]:
+        """Number of live tasks per tag (only those matching a query, if given)"""
+        return self.tag_index.counts(None if query is None else self.tag_index.query(query))
     
     def _update_timestamp(self):
         """Update last modified timestamp"""
         self.data.last_updated = datetime.now()
+        # The store as a whole changed, its sections didn't
+        self.revision = next(_revisions)
     
     def reload(self):
         """Reload data from file"""
         self.load_from_file()
         self._build_indexes()
+        # Undo steps were recorded against the state we just replaced
+        self.history.clear()
+        if self.persist_history:
+            self.history.save(self.history_path, self.file_version)
     
     def reset_to_default(self):
         """Reset data to default state"""
+        self.history.clear()
+        self._new_revision()
         self._create_default_file()
         self._build_indexes()
\ No newline at end of file
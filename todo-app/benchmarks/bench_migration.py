@@ -0,0 +1,99 @@
+"""
+Time the streaming 1.0 -> 2.0 migration of a large store, with an optional interruption
+
+    python benchmarks/bench_migration.py --sections 100 --tasks 10000                 # 1M tasks
+    python benchmarks/bench_migration.py --sections 100 --tasks 10000 --interrupt-at 0.5
+"""
+
+import argparse
+import json
+import resource
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from backend import Todo, migrations
+from backend.migrations import migrate_file
+
+
+def write_v1_store(path: Path, sections: int, tasks: int) -> int:
+    """Write a store in the 1.0 format (baseline task fields only) without building it in memory"""
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write('{\n    "version": "1.0",\n    "created_at": "2024-01-01T00:00:00",\n'
+                '    "last_updated": "2024-01-01T00:00:00",\n    "settings": {},\n    "sections": [\n')
+        for s in range(sections):
+            f.write(("" if s == 0 else ",\n") + f'        {{"name": "Section {s}", "tasks": [\n')
+            f.write(",\n".join(json.dumps({
+                "id": f"{s:04x}{t:06x}",
+                "title": f"Task {s}.{t}",
+                "description": "Generated task",
+                "completed": t % 2 == 0,
+                "subtasks": [],
+                "created_at": "2024-01-01T00:00:00",
+                "updated_at": "2024-01-01T00:00:00",
+            }) for t in range(tasks)))
+            f.write('\n        ], "created_at": "2024-01-01T00:00:00", "updated_at": "2024-01-01T00:00:00"}')
+        f.write("\n    ]\n}\n")
+    return sections * tasks
+
+
+def peak_rss_mb() -> float:
+    # ru_maxrss is KiB on Linux, bytes on macOS
+    scale = 1024 * 1024 if sys.platform == "darwin" else 1024
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / scale
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sections", type=int, default=100)
+    parser.add_argument("--tasks", type=int, default=10000, help="tasks per section")
+    parser.add_argument("--interrupt-at", type=float, help="stop the first run after this share of tasks")
+    parser.add_argument("--load", action="store_true", help="also time loading the migrated store")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = Path(tmp) / "store.json"
+        start = time.perf_counter()
+        total = write_v1_store(path, args.sections, args.tasks)
+        results = {"tasks": total, "file_bytes": path.stat().st_size,
+                   "generate_seconds": round(time.perf_counter() - start, 2),
+                   "rss_before_mb": round(peak_rss_mb(), 1)}
+
+        if args.interrupt_at:
+            step = migrations.MIGRATIONS["1.0"]
+            upgrade, seen = step.task, [0]
+
+            def interrupted(task):
+                seen[0] += 1
+                if seen[0] > total * args.interrupt_at:
+                    raise KeyboardInterrupt
+                return upgrade(task)
+            step.task = interrupted
+            start = time.perf_counter()
+            try:
+                migrate_file(path)
+            except KeyboardInterrupt:
+                pass
+            step.task = upgrade
+            results["interrupted_run_seconds"] = round(time.perf_counter() - start, 2)
+
+        start = time.perf_counter()
+        migrate_file(path)
+        results["migrate_seconds"] = round(time.perf_counter() - start, 2)
+        results["migrated_file_bytes"] = path.stat().st_size
+        results["peak_rss_mb"] = round(peak_rss_mb(), 1)
+
+        if args.load:
+            start = time.perf_counter()
+            todo = Todo(str(path))
+            results["load_seconds"] = round(time.perf_counter() - start, 2)
+            results["loaded_tasks"] = len(todo.task_index)
+
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
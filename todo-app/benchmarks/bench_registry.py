@@ -0,0 +1,69 @@
+"""
+Open thousands of lists through a TodoRegistry and check memory stays bounded
+
+    python benchmarks/bench_registry.py --lists 2000 --tasks 50 --max-open 64
+"""
+
+import argparse
+import contextlib
+import json
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from backend import TodoRegistry
+from generate import write_store
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--lists", type=int, default=2000)
+    parser.add_argument("--tasks", type=int, default=50)
+    parser.add_argument("--max-open", type=int, default=64)
+    parser.add_argument("--rounds", type=int, default=2, help="passes over all lists")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        for i in range(args.lists):
+            write_store(Path(tmp) / f"list-{i}.json", 1, args.tasks, seed=i)
+
+        registry = TodoRegistry(tmp, max_open=args.max_open)
+        tracemalloc.start()
+        peak_current = 0
+        start = time.perf_counter()
+        # Todo prints on every load
+        with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+            for _ in range(args.rounds):
+                for i in range(args.lists):
+                    registry.get(f"list-{i}")
+                    # Hot list: should always be a cache hit
+                    registry.get("list-0")
+                    peak_current = max(peak_current, tracemalloc.get_traced_memory()[0])
+        elapsed = time.perf_counter() - start
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        registry.close_all()
+
+    requests = args.rounds * args.lists * 2
+    print(json.dumps({
+        "lists": args.lists,
+        "tasks_per_list": args.tasks,
+        "max_open": args.max_open,
+        "requests": requests,
+        "hits": registry.hits,
+        "misses": registry.misses,
+        "evictions": registry.evictions,
+        "seconds": round(elapsed, 3),
+        "us_per_request": round(elapsed / requests * 1e6, 1),
+        "max_traced_bytes": peak_current,
+        "peak_traced_bytes": peak,
+    }, indent=2))
+
+
+if __name__ == "__main__":
+    main()
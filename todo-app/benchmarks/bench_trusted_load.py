@@ -0,0 +1,63 @@
+"""
+Compare Todo load time with full validation and on the trusted (checksummed) path
+
+    python benchmarks/bench_trusted_load.py --sections 100 --tasks 5000     # 500k tasks
+"""
+
+import argparse
+import contextlib
+import json
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from backend import Todo
+from generate import write_store, count_tasks
+
+
+def timed_load(path: Path, **options) -> tuple:
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+        start = time.perf_counter()
+        todo = Todo(str(path), **options)
+        elapsed = time.perf_counter() - start
+    return elapsed, todo
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sections", type=int, default=100)
+    parser.add_argument("--tasks", type=int, default=5000, help="top-level tasks per section")
+    parser.add_argument("--depth", type=int, default=0)
+    parser.add_argument("--branching", type=int, default=1)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = write_store(Path(tmp) / "store.json", args.sections, args.tasks, args.depth, args.branching)
+        # Re-save through Todo so the file carries a checksum header
+        _, todo = timed_load(path)
+        with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+            todo.save_to_file()
+        del todo
+
+        results = {"tasks": count_tasks(args.sections, args.tasks, args.depth, args.branching),
+                   "file_bytes": path.stat().st_size}
+        for mode, options in (("validated", {"always_validate": True}), ("trusted", {})):
+            times = []
+            for _ in range(args.repeat):
+                elapsed, todo = timed_load(path, **options)
+                assert todo.last_load_trusted == (mode == "trusted")
+                times.append(elapsed)
+                del todo
+            results[f"{mode}_seconds"] = round(min(times), 3)
+        results["speedup"] = round(results["validated_seconds"] / results["trusted_seconds"], 2)
+
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,57 @@
+"""
+Synthetic Todo stores for benchmarks: sections x tasks x subtask depth
+"""
+
+import itertools
+import json
+import random
+from datetime import datetime, timedelta
+from pathlib import Path
+
+from backend.data import TodoModel, SectionModel, TaskModel
+
+
+def generate_task(rng: random.Random, ids, name: str, depth: int, branching: int) -> TaskModel:
+    """A task with `branching` subtasks per level, `depth` levels deep"""
+    now = datetime.now()
+    return TaskModel(
+        id=f"{next(ids):08x}",
+        title=f"Task {name}",
+        description="Generated task",
+        completed=rng.random() < 0.5,
+        due_at=now + timedelta(hours=rng.randint(-240, 240)) if rng.random() < 0.3 else None,
+        priority=rng.randint(1, 4) if rng.random() < 0.3 else None,
+        created_at=now - timedelta(minutes=rng.randint(0, 60 * 24 * 90)),
+        subtasks=[
+            generate_task(rng, ids, f"{name}.{i}", depth - 1, branching)
+            for i in range(branching if depth > 0 else 0)
+        ],
+    )
+
+
+def generate_store(sections: int, tasks: int, depth: int = 0, branching: int = 1,
+                   seed: int = 0) -> TodoModel:
+    """Build a store in memory (same seed -> same store)"""
+    rng = random.Random(seed)
+    ids = itertools.count()
+    return TodoModel(sections=[
+        SectionModel(name=f"Section {s}", tasks=[
+            generate_task(rng, ids, f"{s}.{t}", depth, branching) for t in range(tasks)
+        ])
+        for s in range(sections)
+    ])
+
+
+def write_store(path: Path, sections: int, tasks: int, depth: int = 0, branching: int = 1,
+                seed: int = 0) -> Path:
+    """Write a generated store in the same format as Todo.save_to_file"""
+    data = generate_store(sections, tasks, depth, branching, seed)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(data.model_dump(), f, ensure_ascii=False, indent=4, default=str)
+    return path
+
+
+def count_tasks(sections: int, tasks: int, depth: int = 0, branching: int = 1) -> int:
+    """Number of tasks (including subtasks) generate_store produces"""
+    return sections * tasks * sum(branching ** level for level in range(depth + 1))
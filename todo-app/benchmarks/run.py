@@ -0,0 +1,196 @@
+"""
+Benchmark suite for the Todo store and the API
+
+    python benchmarks/run.py                              # run and print results
+    python benchmarks/run.py --output results.json        # also write them to a file
+    python benchmarks/run.py --save-baseline              # store results as the new baseline
+    python benchmarks/run.py --baseline benchmarks/baseline.json --threshold 0.25
+
+With a baseline, every case whose median time (or peak memory) grew by more than
+the threshold is reported and the exit code is 1.
+"""
+
+import argparse
+import contextlib
+import gc
+import json
+import os
+import platform
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Callable, Dict
+
+BENCH_DIR = Path(__file__).resolve().parent
+sys.path.insert(0, str(BENCH_DIR.parent))
+
+from backend import Todo, TodoRegistry
+from generate import write_store, count_tasks
+
+DEFAULT_BASELINE = BENCH_DIR / "baseline.json"
+
+
+@contextlib.contextmanager
+def quiet():
+    """Todo prints on every load/save; keep that out of the results"""
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+        yield
+
+
+def measure(fn: Callable[[Any], Any], setup: Callable[[], Any] = lambda: None,
+            repeat: int = 5) -> Dict[str, float]:
+    """Time fn(setup()) `repeat` times, then run it once more under tracemalloc for peak memory"""
+    times = []
+    with quiet():
+        for _ in range(repeat):
+            arg = setup()
+            gc.collect()
+            start = time.perf_counter()
+            fn(arg)
+            times.append(time.perf_counter() - start)
+
+        arg = setup()
+        gc.collect()
+        tracemalloc.start()
+        fn(arg)
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+    return {
+        "min_ms": round(min(times) * 1000, 3),
+        "median_ms": round(statistics.median(times) * 1000, 3),
+        "mean_ms": round(statistics.mean(times) * 1000, 3),
+        "peak_bytes": peak,
+    }
+
+
+def run_cases(store_path: Path, repeat: int) -> Dict[str, Dict[str, float]]:
+    """Run every benchmark case against a copy of the generated store"""
+    results = {}
+    original = store_path.read_bytes()
+
+    def fresh_todo() -> Todo:
+        store_path.write_bytes(original)
+        with quiet():
+            return Todo(str(store_path))
+
+    results["load"] = measure(lambda _: Todo(str(store_path)), lambda: store_path.write_bytes(original), repeat)
+
+    # Same data re-saved by Todo, so it carries a checksum and loads on the trusted path
+    trusted_path = store_path.with_name("trusted.json")
+    with quiet():
+        Todo(str(store_path)).save_to_file()
+    trusted_path.write_bytes(store_path.read_bytes())
+    results["load_trusted"] = measure(lambda _: Todo(str(trusted_path)), repeat=repeat)
+    results["save"] = measure(lambda todo: todo.save_to_file(), fresh_todo, repeat)
+    results["build_indexes"] = measure(lambda todo: todo._build_indexes(), fresh_todo, repeat)
+    results["create_task"] = measure(lambda todo: todo.create_task("Benchmark task", "Section 0"),
+                                     fresh_todo, repeat)
+
+    def todo_and_task():
+        todo = fresh_todo()
+        return todo, todo.data.sections[0].tasks[-1].id
+
+    results["remove_task_by_id"] = measure(lambda args: args[0].remove_task_by_id(args[1]),
+                                           todo_and_task, repeat)
+    results["get_completed_tasks"] = measure(lambda todo: todo.get_completed_tasks(), fresh_todo, repeat)
+
+    # The /api request path through the Flask test client
+    import api
+    store_path.write_bytes(original)
+
+    def fresh_client():
+        api.registry = TodoRegistry(str(store_path.parent), paths={api.DEFAULT_LIST: str(store_path)})
+        return api.app.test_client()
+
+    def warm_client():
+        client = fresh_client()
+        with quiet():
+            client.get("/api")
+        return client
+
+    results["api_get_cold"] = measure(lambda client: client.get("/api"), fresh_client, repeat)
+    results["api_get_cached"] = measure(lambda client: client.get("/api"), warm_client, repeat)
+    return results
+
+
+def compare(results: Dict[str, Any], baseline: Dict[str, Any], threshold: float) -> list:
+    """List cases that got slower (median) or bigger (peak memory) than the baseline allows"""
+    regressions = []
+    for name, current in results["cases"].items():
+        previous = baseline.get("cases", {}).get(name)
+        if not previous:
+            continue
+        for metric in ("median_ms", "peak_bytes"):
+            if previous[metric] and current[metric] > previous[metric] * (1 + threshold):
+                regressions.append(f"{name}.{metric}: {previous[metric]} -> {current[metric]} "
+                                   f"(+{(current[metric] / previous[metric] - 1) * 100:.0f}%)")
+    return regressions
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sections", type=int, default=10)
+    parser.add_argument("--tasks", type=int, default=200, help="top-level tasks per section")
+    parser.add_argument("--depth", type=int, default=1, help="subtask levels below each task")
+    parser.add_argument("--branching", type=int, default=2, help="subtasks per task per level")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--output", type=Path, help="write results JSON here")
+    parser.add_argument("--baseline", type=Path, default=DEFAULT_BASELINE)
+    parser.add_argument("--save-baseline", action="store_true", help="write results to --baseline")
+    parser.add_argument("--threshold", type=float, default=0.25, help="allowed growth before a regression")
+    args = parser.parse_args()
+
+    shape = {
+        "sections": args.sections,
+        "tasks": args.tasks,
+        "depth": args.depth,
+        "branching": args.branching,
+        "seed": args.seed,
+        "total_tasks": count_tasks(args.sections, args.tasks, args.depth, args.branching),
+    }
+    with tempfile.TemporaryDirectory() as tmp:
+        store_path = write_store(Path(tmp) / "store.json", args.sections, args.tasks,
+                                 args.depth, args.branching, args.seed)
+        file_bytes = store_path.stat().st_size
+        cases = run_cases(store_path, args.repeat)
+
+    results = {
+        "timestamp": datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "store": shape,
+        "file_bytes": file_bytes,
+        "cases": cases,
+    }
+    print(json.dumps(results, indent=2))
+    if args.output:
+        args.output.write_text(json.dumps(results, indent=2))
+
+    if args.save_baseline:
+        args.baseline.write_text(json.dumps(results, indent=2))
+        print(f"Saved baseline: {args.baseline}", file=sys.stderr)
+        return 0
+
+    if args.baseline.exists():
+        baseline = json.loads(args.baseline.read_text())
+        if baseline.get("store") != shape:
+            print("Baseline was recorded with a different store shape, not comparing", file=sys.stderr)
+            return 0
+        regressions = compare(results, baseline, args.threshold)
+        if regressions:
+            print("Regressions against baseline:", file=sys.stderr)
+            for line in regressions:
+                print(f"  {line}", file=sys.stderr)
+            return 1
+        print("No regressions against baseline", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
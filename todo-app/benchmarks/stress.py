@@ -0,0 +1,359 @@
+"""
+Run random mixed operations against one store from many threads or processes, then check it is consistent
+
+    python benchmarks/stress.py --workers 8 --ops 500                      # threads sharing one Todo
+    python benchmarks/stress.py --mode processes --workers 4 --ops 200     # a Todo per process, file lock
+    python benchmarks/stress.py --sharded --mix create=60,remove_section=10
+
+Every worker wraps each operation in Todo.transaction(). Afterwards the store must have
+every task in exactly one container, indexes matching the data, a file that loads back
+to the same data, and no lost updates (every task created and not removed is there,
+every task completed is still completed). The exit code is 1 if any check fails.
+"""
+
+import argparse
+import contextlib
+import json
+import multiprocessing
+import os
+import random
+import statistics
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Set
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from backend import Todo
+from generate import write_store
+
+DEFAULT_MIX = "create=45,complete=25,remove=15,trash=5,remove_section=2,read=8"
+TAGS = ("work", "home", "urgent", "later", "errand")
+
+
+def parse_mix(text: str) -> Dict[str, int]:
+    """"create=45,complete=25,..." -> operation weights"""
+    mix = {}
+    for part in text.split(","):
+        name, _, weight = part.partition("=")
+        if name.strip() not in OPERATIONS:
+            raise ValueError(f"Unknown operation '{name.strip()}' (choose from {', '.join(OPERATIONS)})")
+        mix[name.strip()] = int(weight)
+    return mix
+
+
+def subtree_ids(task) -> List[str]:
+    ids = [task.id]
+    for subtask in task.subtasks:
+        ids.extend(subtree_ids(subtask))
+    return ids
+
+# ======= operations ========
+# Each runs inside a transaction and notes what it did in the worker's ledger
+
+
+def op_create(todo: Todo, rng: random.Random, ledger: Dict[str, Set[str]], sections: int):
+    task = todo.create_task(f"Stress {rng.random():.6f}", f"Section {rng.randrange(sections)}",
+                            tags=rng.sample(TAGS, rng.randint(0, 2)),
+                            due_at=datetime.now() + timedelta(hours=rng.randint(-48, 48))
+                            if rng.random() < 0.3 else None,
+                            priority=rng.randint(1, 4) if rng.random() < 0.3 else None)
+    ledger["created"].add(task.id)
+
+
+def random_task(todo: Todo, rng: random.Random):
+    todo.load_all_shards()
+    if not todo.task_index:
+        return None
+    return todo.task_index[rng.choice(list(todo.task_index))]
+
+
+def op_complete(todo: Todo, rng: random.Random, ledger: Dict[str, Set[str]], sections: int):
+    task = random_task(todo, rng)
+    if task is not None and todo.complete_task(task.id):
+        ledger["completed"].add(task.id)
+
+
+def op_remove(todo: Todo, rng: random.Random, ledger: Dict[str, Set[str]], sections: int):
+    task = random_task(todo, rng)
+    if task is not None:
+        ids = subtree_ids(task)
+        if todo.remove_task_by_id(task.id):
+            ledger["removed"].update(ids)
+
+
+def op_trash(todo: Todo, rng: random.Random, ledger: Dict[str, Set[str]], sections: int):
+    task = random_task(todo, rng)
+    if task is not None:
+        todo.soft_delete_task(task.id)
+
+
+def op_remove_section(todo: Todo, rng: random.Random, ledger: Dict[str, Set[str]], sections: int):
+    name = f"Section {rng.randrange(sections)}"
+    section = todo.get_section_by_name(name)
+    if section is not None:
+        ids = [task_id for task in section.tasks for task_id in subtree_ids(task)]
+        if todo.remove_section_by_name(name):
+            ledger["removed"].update(ids)
+
+
+def op_read(todo: Todo, rng: random.Random, ledger: Dict[str, Set[str]], sections: int):
+    todo.section_summaries()
+    todo.find_tasks(rng.choice(TAGS) + " pending")
+
+
+OPERATIONS = {
+    "create": op_create,
+    "complete": op_complete,
+    "remove": op_remove,
+    "trash": op_trash,
+    "remove_section": op_remove_section,
+    "read": op_read,
+}
+
+# ======= workers ========
+
+
+def run_worker(todo: Todo, seed: int, ops: int, mix: Dict[str, int], sections: int,
+               start: Optional[threading.Barrier] = None) -> Dict[str, Any]:
+    """Run `ops` random operations; returns per-operation latencies and the ledger"""
+    rng = random.Random(seed)
+    names, weights = list(mix), list(mix.values())
+    ledger = {"created": set(), "removed": set(), "completed": set()}
+    latencies: Dict[str, List[float]] = {name: [] for name in names}
+    if start is not None:
+        start.wait()
+    for name in rng.choices(names, weights, k=ops):
+        began = time.perf_counter()
+        with todo.transaction():
+            OPERATIONS[name](todo, rng, ledger, sections)
+        latencies[name].append(time.perf_counter() - began)
+    return {"latencies": latencies, "ledger": ledger}
+
+
+def process_worker(path: str, seed: int, ops: int, mix: Dict[str, int], sections: int) -> Dict[str, Any]:
+    """Process entry point: open the store with the file lock and run a worker"""
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+        todo = Todo(path, process_lock=True)
+        todo.lock.reset_stats()
+        result = run_worker(todo, seed, ops, mix, sections)
+    result["lock"] = todo.lock.stats()
+    return result
+
+
+def run_threads(path: Path, args, mix: Dict[str, int]):
+    todo = Todo(str(path))
+    todo.lock.reset_stats()
+    start = threading.Barrier(args.workers + 1)
+    results: List[Dict[str, Any]] = [None] * args.workers
+
+    def target(i: int):
+        results[i] = run_worker(todo, args.seed + i, args.ops, mix, args.sections, start)
+
+    threads = [threading.Thread(target=target, args=(i,)) for i in range(args.workers)]
+    for thread in threads:
+        thread.start()
+    start.wait()
+    began = time.perf_counter()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - began
+    if any(result is None for result in results):
+        raise RuntimeError("A worker thread failed")
+    return results, [todo.lock.stats()], elapsed, todo
+
+
+def run_processes(path: Path, args, mix: Dict[str, int]):
+    with multiprocessing.Pool(args.workers) as pool:
+        began = time.perf_counter()
+        results = pool.starmap(process_worker, [(str(path), args.seed + i, args.ops, mix, args.sections)
+                                                for i in range(args.workers)])
+        elapsed = time.perf_counter() - began
+    # Everything is on disk now; check a fresh copy
+    return results, [result["lock"] for result in results], elapsed, Todo(str(path))
+
+# ======= checks ========
+
+
+def check_store(todo: Todo) -> List[str]:
+    """Problems with the containers and indexes of a store (empty if consistent)"""
+    todo.load_all_shards()
+    problems = []
+    names = [section.name for section in todo.data.sections]
+    if len(set(names)) != len(names):
+        problems.append("Duplicate section names")
+    if set(todo.section_index) != set(names) or any(todo.section_index[section.name] is not section
+                                                    for section in todo.data.sections):
+        problems.append("Section index doesn't match the sections")
+
+    # Every task must be reachable exactly once
+    found = {}
+    pending = [(section, task) for section in todo.data.sections for task in section.tasks]
+    while pending:
+        container, task = pending.pop()
+        if task.id in found:
+            problems.append(f"Task {task.id} is in more than one container")
+        found[task.id] = (task, container)
+        pending.extend((task, subtask) for subtask in task.subtasks)
+
+    if set(todo.task_index) != set(found):
+        problems.append(f"Task index has {len(set(todo.task_index) - set(found))} unknown tasks "
+                        f"and misses {len(set(found) - set(todo.task_index))}")
+    for task_id, (task, container) in found.items():
+        if todo.task_index.get(task_id) is not task:
+            problems.append(f"Task index holds another object for {task_id}")
+        if todo.parent_index.get(task_id) is not container:
+            problems.append(f"Parent index has the wrong container for {task_id}")
+
+    tasks = [task for task, _ in found.values()]
+    live = [task for task in tasks if todo.is_live(task)]
+    open_ids = {task.id for task in live if not task.completed}
+    expected = {
+        "created_index": {task.id for task in tasks},
+        "updated_index": {task.id for task in tasks},
+        "deleted_index": {task.id for task in tasks if task.deleted_at},
+        "schedule_index": {task.id for task in live if task.due_at and not task.completed},
+        "tag_index": {task.id for task in live},
+        "recurrences": {task.id for task in live if task.recurrence and task.due_at},
+    }
+    for name, ids in expected.items():
+        index = getattr(todo, name)
+        if len(index) != len(ids) or any(task_id not in index for task_id in ids):
+            problems.append(f"{name} has {len(index)} entries, expected {len(ids)}")
+    tag_counts = Counter(tag for task in live for tag in task.tags)
+    if {tag: count for tag, count in todo.tag_counts().items() if count} != dict(tag_counts):
+        problems.append("Tag counts don't match the tasks")
+    # Tree pages and counts, kept up to date incrementally
+    summaries = {summary["name"]: summary for summary in todo.section_summaries()}
+    for section in todo.data.sections:
+        expected_tasks = [task for task in section.tasks if not task.deleted_at]
+        total, page = todo.get_section_page(section.name, 0, len(section.tasks) + 1)
+        if total != len(expected_tasks) or any(a is not b for a, b in zip(page, expected_tasks)):
+            problems.append(f"Live task list of section '{section.name}' doesn't match its tasks")
+        if summaries[section.name]["completed_count"] != sum(1 for task in expected_tasks if task.completed):
+            problems.append(f"Completed count of section '{section.name}' is wrong")
+    for task in tasks:
+        if todo.live_child_count(task.id) != sum(1 for subtask in task.subtasks if not subtask.deleted_at):
+            problems.append(f"Live subtask count of {task.id} is wrong")
+    ready = {task.id for task in live if task.id in open_ids
+             and not any(blocker in open_ids for blocker in task.blocked_by)}
+    if todo.dependencies.ready != ready:
+        problems.append(f"Ready set has {len(todo.dependencies.ready)} tasks, expected {len(ready)}")
+    return problems
+
+
+def comparable(todo: Todo) -> Dict[str, Any]:
+    data = todo.data.model_dump(mode="json")
+    # Saving stamps a new time after the write
+    data.pop("last_updated", None)
+    return data
+
+
+def check_round_trip(todo: Todo) -> List[str]:
+    """Save the store, load the file into a new Todo and compare"""
+    todo.load_all_shards()
+    todo.save_to_file()
+    loaded = Todo(str(todo.file_path))
+    loaded.load_all_shards()
+    problems = [f"After reload: {problem}" for problem in check_store(loaded)]
+    if comparable(loaded) != comparable(todo):
+        problems.append("The saved file doesn't load back to the same data")
+    return problems
+
+
+def check_ledger(todo: Todo, initial: Set[str], results: List[Dict[str, Any]]) -> List[str]:
+    """No lost updates: created tasks that weren't removed exist, completed ones stay completed"""
+    created = set().union(*(result["ledger"]["created"] for result in results))
+    removed = set().union(*(result["ledger"]["removed"] for result in results))
+    completed = set().union(*(result["ledger"]["completed"] for result in results))
+    expected = (initial | created) - removed
+    actual = set(todo.task_index)
+    problems = []
+    if actual != expected:
+        problems.append(f"{len(expected - actual)} tasks were lost and {len(actual - expected)} "
+                        f"came back after removal")
+    reopened = [task_id for task_id in completed & actual if not todo.task_index[task_id].completed]
+    if reopened:
+        problems.append(f"{len(reopened)} completed tasks are pending again")
+    return problems
+
+# ======= report ========
+
+
+def summarize(results: List[Dict[str, Any]], locks: List[Dict[str, Any]], elapsed: float) -> Dict[str, Any]:
+    operations = {}
+    total = 0
+    for name in results[0]["latencies"]:
+        times = [t for result in results for t in result["latencies"][name]]
+        total += len(times)
+        if len(times) >= 2:
+            quantiles = statistics.quantiles(times, n=100)
+            operations[name] = {"count": len(times), "p50_ms": round(quantiles[49] * 1000, 3),
+                                "p99_ms": round(quantiles[98] * 1000, 3)}
+        else:
+            operations[name] = {"count": len(times)}
+    acquisitions = sum(lock["acquisitions"] for lock in locks)
+    contended = sum(lock["contended"] for lock in locks)
+    return {
+        "ops": total,
+        "seconds": round(elapsed, 3),
+        "ops_per_second": round(total / elapsed, 1) if elapsed else None,
+        "operations": operations,
+        "lock": {
+            "acquisitions": acquisitions,
+            "contended": contended,
+            "contention_rate": round(contended / acquisitions, 3) if acquisitions else 0,
+            "wait_seconds": round(sum(lock["wait_seconds"] for lock in locks), 3),
+            "max_wait_ms": round(max(lock["max_wait_seconds"] for lock in locks) * 1000, 3),
+            "mean_hold_ms": round(sum(lock["held_seconds"] for lock in locks) / acquisitions * 1000, 3)
+            if acquisitions else 0,
+        },
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--mode", choices=("threads", "processes"), default="threads")
+    parser.add_argument("--workers", type=int, default=8)
+    parser.add_argument("--ops", type=int, default=300, help="operations per worker")
+    parser.add_argument("--sections", type=int, default=8)
+    parser.add_argument("--tasks", type=int, default=50, help="initial tasks per section")
+    parser.add_argument("--sharded", action="store_true", help="use the sharded file layout")
+    parser.add_argument("--mix", default=DEFAULT_MIX, help="operation weights")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    try:
+        mix = parse_mix(args.mix)
+    except ValueError as e:
+        parser.error(str(e))
+
+    with tempfile.TemporaryDirectory() as tmp, open(os.devnull, 'w') as devnull:
+        path = Path(tmp) / "store.json"
+        write_store(path, args.sections, args.tasks, seed=args.seed)
+        # Todo prints on every load, save and removal
+        with contextlib.redirect_stdout(devnull):
+            todo = Todo(str(path), sharded=args.sharded)
+            todo.save_to_file()
+            initial = set(todo.task_index)
+            if args.mode == "threads":
+                results, locks, elapsed, todo = run_threads(path, args, mix)
+            else:
+                results, locks, elapsed, todo = run_processes(path, args, mix)
+            problems = check_store(todo) + check_ledger(todo, initial, results) + check_round_trip(todo)
+
+        report = {"mode": args.mode, "workers": args.workers, "sharded": args.sharded,
+                  "tasks_before": len(initial), "tasks_after": len(todo.task_index)}
+        report.update(summarize(results, locks, elapsed))
+        report["problems"] = problems
+
+    print(json.dumps(report, indent=2))
+    sys.exit(1 if problems else 0)
+
+
+if __name__ == "__main__":
+    main()
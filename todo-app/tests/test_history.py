@@ -0,0 +1,139 @@
+import contextlib
+import io
+import sys
+import tempfile
+import unittest
+from datetime import datetime, timedelta
+from pathlib import Path
+
+from backend import Todo
+from backend.data import Task
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "benchmarks"))
+from stress import check_store, comparable
+
+
+def snapshot(todo: Todo):
+    """The stored data without change times (undo restores fields, not when they changed)"""
+    def strip(value):
+        if isinstance(value, dict):
+            # Redoing a move to the trash stamps a new deletion time
+            return {key: bool(item) if key == "deleted_at" else strip(item)
+                    for key, item in value.items() if key != "updated_at"}
+        if isinstance(value, list):
+            return [strip(item) for item in value]
+        return value
+    return strip(comparable(todo))
+
+
+class PersistedHistoryTest(unittest.TestCase):
+    def test_history_is_kept_for_the_same_data_file(self):
+        with tempfile.TemporaryDirectory() as tmp, contextlib.redirect_stdout(io.StringIO()):
+            path = str(Path(tmp) / "todo.json")
+            todo = Todo(path, persist_history=True)
+            task = todo.create_task("Dishes", "Home")
+            todo.close()
+            todo = Todo(path, persist_history=True)
+            self.assertTrue(todo.history.can_undo())
+            self.assertTrue(todo.undo())
+            self.assertIsNone(todo.get_task(task.id))
+
+    def test_history_of_a_changed_data_file_is_dropped(self):
+        with tempfile.TemporaryDirectory() as tmp, contextlib.redirect_stdout(io.StringIO()):
+            path = str(Path(tmp) / "todo.json")
+            todo = Todo(path, persist_history=True)
+            todo.create_task("Dishes", "Home")
+            todo.close()
+            # Saved by something that doesn't keep the history
+            Todo(path).create_task("Laundry", "Home")
+            todo = Todo(path, persist_history=True)
+            self.assertFalse(todo.history.can_undo())
+            self.assertEqual(len(todo.task_index), 2)
+
+
+class UndoRedoRoundTripTest(unittest.TestCase):
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        quiet = contextlib.redirect_stdout(io.StringIO())
+        quiet.__enter__()
+        self.addCleanup(quiet.__exit__, None, None, None)
+        self.todo = Todo(str(Path(tmp.name) / "todo.json"), persist_history=True)
+        todo = self.todo
+        self.tasks = [todo.create_task(f"Task {i}", "Home", due_at=datetime.now() + timedelta(days=i),
+                                       tags=["chores"] if i % 2 else []) for i in range(4)]
+        todo.create_task("Report", "Work", priority=1)
+        todo.add_subtask(self.tasks[1].id, Task(title="Subtask"))
+        todo.add_dependency(self.tasks[2].id, self.tasks[1].id)
+        todo.history.clear()
+
+    def assertConsistent(self):
+        self.assertEqual(check_store(self.todo), [])
+
+    def assertRoundTrips(self, *changes):
+        """Apply changes, then undo them all and redo them all, checking every state on the way"""
+        states = [snapshot(self.todo)]
+        for change in changes:
+            change()
+            self.assertConsistent()
+            states.append(snapshot(self.todo))
+        for state in reversed(states[:-1]):
+            self.assertTrue(self.todo.undo())
+            self.assertConsistent()
+            self.assertEqual(snapshot(self.todo), state)
+        self.assertFalse(self.todo.undo())
+        for state in states[1:]:
+            self.assertTrue(self.todo.redo())
+            self.assertConsistent()
+            self.assertEqual(snapshot(self.todo), state)
+        self.assertFalse(self.todo.redo())
+        # And the history saved with the last change still applies after a reload
+        self.todo.close()
+        reloaded = Todo(str(self.todo.file_path), persist_history=True)
+        self.assertEqual(len(reloaded.history), len(changes))
+        self.assertEqual(check_store(reloaded), [])
+
+    def test_remove_restores_at_the_same_index(self):
+        todo = self.todo
+        middle = self.tasks[1]
+        self.assertRoundTrips(lambda: todo.remove_task_by_id(middle.id),
+                              lambda: todo.remove_task_by_id(self.tasks[0].id))
+        self.assertEqual([task.id for task in todo.get_section_by_name("Home").tasks],
+                         [self.tasks[2].id, self.tasks[3].id])
+        todo.undo()
+        todo.undo()
+        self.assertEqual([task.id for task in todo.get_section_by_name("Home").tasks],
+                         [task.id for task in self.tasks])
+
+    def test_batch_operations(self):
+        todo = self.todo
+        todo.set_recurrence(self.tasks[0].id, "daily")
+        todo.history.clear()
+
+        def complete():
+            # Also creates the next occurrence: one undo step for both
+            todo.complete_task(self.tasks[0].id)
+            self.assertEqual(todo.history.undo_stack[-1][0]["op"], "batch")
+
+        def fall_behind():
+            occurrence = next(task for task in todo.get_section_by_name("Home").tasks if task.recurrence)
+            todo.update_task(occurrence.id, due_at=datetime.now() - timedelta(days=3))
+
+        def materialize():
+            self.assertTrue(todo.materialize_recurrences())
+            self.assertEqual(todo.history.undo_stack[-1][0]["op"], "batch")
+
+        self.assertRoundTrips(complete, fall_behind, materialize)
+
+    def test_mixed_operations(self):
+        todo = self.todo
+        self.assertRoundTrips(lambda: todo.soft_delete_task(self.tasks[1].id),
+                              lambda: todo.tag_task(self.tasks[3].id, add=["urgent"], remove=["chores"]),
+                              lambda: todo.complete_task(self.tasks[2].id),
+                              lambda: todo.remove_section_by_name("Work"),
+                              lambda: todo.restore_deleted_task(self.tasks[1].id),
+                              lambda: todo.create_task("New", "Home"))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,182 @@
+import contextlib
+import io
+import json
+import shutil
+import tempfile
+import unittest
+from pathlib import Path
+
+from backend import Todo
+from backend import migrations
+from backend.migrations import PROGRESS_SUFFIX, TEMP_SUFFIX, UnsupportedVersionError, migrate_file
+
+STAMP = "2024-01-01T00:00:00"
+
+
+class Interrupted(Exception):
+    pass
+
+
+def v1_section(name: str, tasks: int) -> dict:
+    """A 1.0 section: tasks with only the baseline fields (ids and dates fixed, so runs compare)"""
+    return {"name": name, "created_at": STAMP, "updated_at": STAMP, "tasks": [
+        {"id": f"{name}-{t}", "title": f"Task {t}", "completed": t % 2 == 0, "created_at": STAMP,
+         "updated_at": STAMP, "subtasks": [{"id": f"{name}-{t}-sub", "title": "Subtask",
+                                            "created_at": STAMP, "updated_at": STAMP}]}
+        for t in range(tasks)]}
+
+
+def write_v1_store(path: Path, sections: int, tasks: int):
+    path.write_text(json.dumps({"version": "1.0", "created_at": STAMP, "last_updated": STAMP, "settings": {},
+                                "sections": [v1_section(f"S{s}", tasks) for s in range(sections)]}, indent=2))
+
+
+def write_v1_sharded_store(path: Path, sections: int, tasks: int):
+    shard_dir = path.with_name(f"{path.stem}.sections")
+    shard_dir.mkdir()
+    entries = []
+    for s in range(sections):
+        section = v1_section(f"S{s}", tasks)
+        entries.append({"name": section["name"], "file": f"S{s}.json", "count": tasks, "completed": 0,
+                        "revision": 0, "created_at": STAMP, "updated_at": STAMP})
+        (shard_dir / f"S{s}.json").write_text(json.dumps(section, indent=2))
+    path.write_text(json.dumps({"version": "1.0", "format": "sharded", "created_at": STAMP,
+                                "last_updated": STAMP, "settings": {}, "sections": entries}))
+
+
+class MigrationRun:
+    """Count the tasks a migration upgrades, optionally stopping before the nth one"""
+
+    def __init__(self, stop_before: int = 0):
+        self.stop_before = stop_before
+        self.upgraded = 0
+
+    @contextlib.contextmanager
+    def patched(self):
+        step = migrations.MIGRATIONS["1.0"]
+        upgrade = step.task
+
+        def counted(task):
+            if self.stop_before and self.upgraded + 1 >= self.stop_before:
+                raise Interrupted
+            self.upgraded += 1
+            return upgrade(task)
+        step.task = counted
+        try:
+            yield self
+        finally:
+            step.task = upgrade
+
+    def migrate(self, path: Path, checkpoint_every: int):
+        with self.patched():
+            migrate_file(path, checkpoint_every)
+
+
+class ResumeTest(unittest.TestCase):
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.dir = Path(tmp.name)
+        quiet = contextlib.redirect_stdout(io.StringIO())
+        quiet.__enter__()
+        self.addCleanup(quiet.__exit__, None, None, None)
+
+    def migrated_copy(self, path: Path) -> Path:
+        """The same file migrated in one go, to compare the resumed run with"""
+        reference = self.dir / "reference" / path.name
+        reference.parent.mkdir(exist_ok=True)
+        shutil.copy(path, reference)
+        migrate_file(reference)
+        return reference
+
+    def interrupt(self, path: Path, stop_before: int, checkpoint_every: int) -> dict:
+        """Run a migration that stops part way and return its checkpoint"""
+        with self.assertRaises(Interrupted):
+            MigrationRun(stop_before).migrate(path, checkpoint_every)
+        self.assertTrue(path.with_name(path.name + TEMP_SUFFIX).exists())
+        return json.loads(path.with_name(path.name + PROGRESS_SUFFIX).read_text())
+
+    def assertResumes(self, path: Path, checkpoint_every: int, total: int, done: int):
+        reference = self.migrated_copy(path)
+        run = MigrationRun()
+        run.migrate(path, checkpoint_every)
+        # Only the tasks after the checkpoint are upgraded again
+        self.assertEqual(run.upgraded, total - done)
+        self.assertEqual(path.read_text(), reference.read_text())
+        self.assertFalse(path.with_name(path.name + PROGRESS_SUFFIX).exists())
+        self.assertFalse(path.with_name(path.name + TEMP_SUFFIX).exists())
+
+    def test_resume_from_mid_section_checkpoint(self):
+        path = self.dir / "todo.json"
+        write_v1_store(path, sections=3, tasks=5)
+        # Checkpoints after every 2 tasks; the last one before task 9 is at task 8 (section 1, task 3)
+        checkpoint = self.interrupt(path, stop_before=9, checkpoint_every=2)
+        self.assertEqual((checkpoint["section"], checkpoint["task"]), (1, 3))
+        self.assertResumes(path, 2, total=15, done=8)
+
+    def test_resume_from_end_of_section_checkpoint(self):
+        path = self.dir / "todo.json"
+        write_v1_store(path, sections=3, tasks=3)
+        # The checkpoint after task 3 is at the last task of section 0
+        checkpoint = self.interrupt(path, stop_before=5, checkpoint_every=3)
+        self.assertEqual((checkpoint["section"], checkpoint["task"]), (0, 3))
+        self.assertResumes(path, 3, total=9, done=3)
+
+    def test_resume_from_section_start_checkpoint(self):
+        path = self.dir / "todo.json"
+        write_v1_store(path, sections=3, tasks=3)
+        # With a checkpoint after every task, the end of a section records the next one as not started
+        checkpoint = self.interrupt(path, stop_before=4, checkpoint_every=0)
+        self.assertEqual((checkpoint["section"], checkpoint["task"]), (1, None))
+        self.assertResumes(path, 0, total=9, done=3)
+
+    def test_source_changed_between_runs_starts_over(self):
+        path = self.dir / "todo.json"
+        write_v1_store(path, sections=3, tasks=5)
+        self.interrupt(path, stop_before=9, checkpoint_every=2)
+        write_v1_store(path, sections=3, tasks=6)
+        self.assertResumes(path, 2, total=18, done=0)
+        self.assertEqual(len(Todo(str(path)).task_index), 36)
+
+    def test_resume_sharded_store(self):
+        path = self.dir / "todo.json"
+        write_v1_sharded_store(path, sections=3, tasks=4)
+        reference = self.dir / "reference" / "todo.json"
+        reference.parent.mkdir()
+        shutil.copy(path, reference)
+        shutil.copytree(path.with_name("todo.sections"), reference.with_name("todo.sections"))
+        migrate_file(reference)
+
+        # Section 0 is done, section 1 stops after its checkpoint at task 2
+        with self.assertRaises(Interrupted):
+            MigrationRun(stop_before=7).migrate(path, checkpoint_every=2)
+        progress = json.loads(path.with_name(path.name + PROGRESS_SUFFIX).read_text())
+        self.assertEqual(progress["done"], ["S0.json"])
+        section_checkpoint = json.loads((self.dir / "todo.sections" / ("S1.json" + PROGRESS_SUFFIX)).read_text())
+        self.assertEqual((section_checkpoint["section"], section_checkpoint["task"]), (0, 2))
+        self.assertEqual(migrations.read_header(path)["version"], "1.0")
+
+        run = MigrationRun()
+        run.migrate(path, checkpoint_every=2)
+        self.assertEqual(run.upgraded, 12 - 6)
+        for name in ("todo.json", "todo.sections/S0.json", "todo.sections/S1.json", "todo.sections/S2.json"):
+            self.assertEqual((self.dir / name).read_text(), (reference.parent / name).read_text(), name)
+        todo = Todo(str(path))
+        todo.load_all_shards()
+        self.assertEqual(len(todo.task_index), 24)
+
+
+class UnsupportedVersionTest(unittest.TestCase):
+    def test_newer_store_is_left_alone(self):
+        with tempfile.TemporaryDirectory() as tmp, contextlib.redirect_stdout(io.StringIO()):
+            path = Path(tmp) / "todo.json"
+            path.write_text(json.dumps({"version": "99.0", "sections": [
+                {"name": "Home", "tasks": [{"id": "a", "title": "Dishes", "added_later": True}]}]}))
+            before = path.read_text()
+            with self.assertRaises(UnsupportedVersionError):
+                Todo(str(path))
+            self.assertEqual(path.read_text(), before)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,75 @@
+import calendar
+import contextlib
+import io
+import tempfile
+import unittest
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+
+from backend import Todo
+from backend.recurrence import next_occurrence
+
+
+def series(rule: str, start: datetime, count: int):
+    """The first `count` due dates of a series, each computed from the one before"""
+    dates = [start]
+    while len(dates) < count:
+        dates.append(next_occurrence(rule, dates[-1], start))
+    return dates
+
+
+class MonthEndTest(unittest.TestCase):
+    def test_monthly_on_31st_keeps_its_day(self):
+        dates = series("monthly", datetime(2025, 1, 31, 9), 12)
+        self.assertEqual([d.day for d in dates], [31, 28, 31, 30, 31, 30, 31, 31, 30, 31, 30, 31])
+        self.assertEqual(dates[-1], datetime(2025, 12, 31, 9))
+
+    def test_yearly_on_leap_day(self):
+        dates = series("yearly", datetime(2024, 2, 29), 5)
+        self.assertEqual(dates, [datetime(2024, 2, 29), datetime(2025, 2, 28), datetime(2026, 2, 28),
+                                 datetime(2027, 2, 28), datetime(2028, 2, 29)])
+
+    def test_occurrences_keep_the_anchor(self):
+        with tempfile.TemporaryDirectory() as tmp, contextlib.redirect_stdout(io.StringIO()):
+            todo = Todo(str(Path(tmp) / "todo.json"))
+            # Next year, so materializing stays within the allowed horizon
+            year = datetime.now().year + 1
+            february = calendar.monthrange(year, 2)[1]
+            task = todo.create_task("Rent", "Home", due_at=datetime(year, 1, 31, 9))
+            todo.set_recurrence(task.id, "monthly")
+            due = []
+            for now in (datetime(year, 2, february, 12), datetime(year, 3, 31, 12), datetime(year, 4, 30, 12)):
+                task, = todo.materialize_recurrences(now)
+                due.append(task.due_at)
+            self.assertEqual(due, [datetime(year, 2, february, 9), datetime(year, 3, 31, 9),
+                                   datetime(year, 4, 30, 9)])
+            # And after a reload
+            self.assertEqual(Todo(str(todo.file_path)).recurrences.peek(), datetime(year, 5, 31, 9))
+
+    def test_moving_a_task_moves_its_anchor(self):
+        with tempfile.TemporaryDirectory() as tmp, contextlib.redirect_stdout(io.StringIO()):
+            todo = Todo(str(Path(tmp) / "todo.json"))
+            task = todo.create_task("Rent", "Home", due_at=datetime(2025, 1, 31, 9))
+            todo.set_recurrence(task.id, "monthly")
+            # Stored like due_at itself: naive local time
+            task = todo.update_task(task.id, due_at=datetime(2025, 3, 15, 9, tzinfo=timezone.utc))
+            self.assertIsNone(task.due_at.tzinfo)
+            self.assertEqual(task.recurrence_anchor, task.due_at)
+
+
+class ReadQueryTest(unittest.TestCase):
+    def test_overdue_only_creates_occurrences_up_to_now(self):
+        with tempfile.TemporaryDirectory() as tmp, contextlib.redirect_stdout(io.StringIO()):
+            todo = Todo(str(Path(tmp) / "todo.json"))
+            task = todo.create_task("Dishes", "Home", due_at=datetime.now() + timedelta(hours=1))
+            todo.set_recurrence(task.id, "daily")
+            overdue = todo.overdue(datetime.now() + timedelta(days=30))
+            self.assertEqual([t.id for t in overdue], [task.id])
+            self.assertEqual(len(todo.task_index), 1)
+            with self.assertRaises(ValueError):
+                todo.materialize_recurrences(datetime(9999, 12, 31))
+            self.assertEqual(len(todo.task_index), 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,31 @@
+import contextlib
+import io
+import tempfile
+import unittest
+from pathlib import Path
+
+from backend import Todo
+from backend.data import Task
+
+
+class TaskShardTest(unittest.TestCase):
+    def test_single_task_operations_load_only_its_section(self):
+        with tempfile.TemporaryDirectory() as tmp, contextlib.redirect_stdout(io.StringIO()):
+            path = str(Path(tmp) / "todo.json")
+            todo = Todo(path, sharded=True)
+            tasks = {section: todo.create_task("Task", section) for section in ("Home", "Work", "Shop")}
+            subtask = Task(title="Subtask")
+            todo.add_subtask(tasks["Work"].id, subtask)
+
+            todo = Todo(path)
+            self.assertEqual(todo.get_task(tasks["Home"].id).id, tasks["Home"].id)
+            self.assertEqual(todo._unloaded, {"Work", "Shop"})
+            self.assertTrue(todo.complete_task(subtask.id).completed)
+            self.assertEqual(todo._unloaded, {"Shop"})
+            self.assertIsNone(todo.get_task("missing"))
+            self.assertEqual(todo._unloaded, {"Shop"})
+            self.assertTrue(Todo(path).get_task(subtask.id).completed)
+
+
+if __name__ == "__main__":
+    unittest.main()